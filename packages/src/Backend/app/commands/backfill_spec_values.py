@@ -0,0 +1,47 @@
+"""
+Backfills product_spec_values (typed spec rows used by spec filters) from Product.specs.
+
+Run from packages/src/Backend:
+    python -m app.commands.backfill_spec_values [--batch-size 1000]
+"""
+import argparse
+import time
+from .. import models
+from ..database import SessionLocal
+from ..utils import products as product_utils
+
+
+def backfill(batch_size: int = 1000):
+    db = SessionLocal()
+    start = time.perf_counter()
+    last_id, total = 0, 0
+    try:
+        while True:
+            # Keyset batches so the scan cost stays flat however large the table is
+            batch = db.query(models.Product.id, models.Product.specs)\
+                .filter(models.Product.id > last_id)\
+                .order_by(models.Product.id)\
+                .limit(batch_size)\
+                .all()
+            if not batch:
+                break
+
+            ids = [row.id for row in batch]
+            product_utils.sync_spec_values(db, ids, {row.id: row.specs for row in batch})
+            db.commit()
+
+            last_id = ids[-1]
+            total += len(batch)
+            print(f"{total} products backfilled (last id {last_id})")
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {total} products in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    backfill(args.batch_size)
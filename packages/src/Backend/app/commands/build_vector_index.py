@@ -0,0 +1,28 @@
+"""
+(Re)builds the semantic search index (FAISS + sentence-transformers) from the product table.
+
+Run from packages/src/Backend:
+    python -m app.commands.build_vector_index
+"""
+import time
+from ..database import SessionLocal
+from ..utils import vector_index
+
+
+def build():
+    if not vector_index.index.available:
+        raise SystemExit("faiss-cpu and sentence-transformers are required (pip install -r requirements.txt)")
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        vector_index.index.build(db)
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: vector index written to {vector_index.index.path} in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,49 @@
+"""
+Builds thumbnail / WebP variants for product images that don't have current ones
+(new uploads get them automatically in the background).
+
+Run from packages/src/Backend:
+    python -m app.commands.generate_image_variants [--batch-size 500]
+"""
+import argparse
+import time
+from .. import models
+from ..database import SessionLocal
+from ..utils import image_variants
+
+
+def generate(batch_size: int = 500):
+    if not image_variants.pool.available:
+        raise SystemExit("Pillow is required (pip install -r requirements.txt)")
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    last_id, total = 0, 0
+    try:
+        while True:
+            ids = [row.id for row in db.query(models.ProductImage.id)
+                   .filter(models.ProductImage.id > last_id)
+                   .order_by(models.ProductImage.id)
+                   .limit(batch_size)]
+            if not ids:
+                break
+
+            # Skips images whose variants already match their bytes
+            for image_id in ids:
+                image_variants.generate_variants(image_id)
+
+            last_id = ids[-1]
+            total += len(ids)
+            print(f"{total} images processed (last id {last_id})")
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {total} images in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    generate(args.batch_size)
@@ -0,0 +1,47 @@
+"""
+Bulk-loads products from an NDJSON or CSV file (same format as POST /product/import):
+batched upserts, categories resolved/created per batch, progress in rows/sec.
+
+Run from packages/src/Backend:
+    python -m app.commands.import_products catalog.ndjson [--format csv] [--batch-size 1000]
+
+The API keeps its search indexes in memory, so restart it afterwards (or import through
+POST /product/import while it is running) and rebuild the semantic index with
+app.commands.build_vector_index.
+"""
+import argparse
+from ..database import SessionLocal
+from ..utils import bulk_import
+
+
+def run(path: str, fmt: str | None = None, batch_size: int = bulk_import.IMPORT_BATCH_SIZE):
+    fmt = fmt or bulk_import.guess_format(path, None)
+    if fmt not in bulk_import.FORMATS:
+        raise SystemExit(f"Can't tell the format of {path}, pass --format {'|'.join(bulk_import.FORMATS)}")
+
+    def progress(report: bulk_import.ImportReport):
+        seconds = report.seconds
+        print(f"{report.rows} rows ({report.rows / seconds:.0f} rows/s), "
+              f"{report.created} created, {report.updated} updated, {report.rejected} rejected")
+
+    db = SessionLocal()
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            report = bulk_import.import_products(db, f, fmt, batch_size, update_indexes=False, progress=progress)
+    finally:
+        db.close()
+
+    for error in report.errors:
+        print(f"line {error.line}: {error.detail}")
+    print(f"Done: {report.rows} rows in {report.seconds:.1f}s ({report.rows_per_second:.0f} rows/s), "
+          f"{report.created} created, {report.updated} updated, {report.categories_created} new categories, "
+          f"{report.rejected} rejected")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=bulk_import.FORMATS)
+    parser.add_argument("--batch-size", type=int, default=bulk_import.IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    run(args.path, args.format, args.batch_size)
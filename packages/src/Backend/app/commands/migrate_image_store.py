@@ -0,0 +1,114 @@
+"""
+Moves product image bytes (originals and variants) between blob stores, e.g. out of
+Postgres bytea columns into the content-addressed filesystem store:
+
+Run from packages/src/Backend (after migrations/003_image_blob_store.sql):
+    IMAGE_STORE=filesystem python -m app.commands.migrate_image_store --to filesystem [--batch-size 200]
+    python -m app.commands.migrate_image_store --to database
+    python -m app.commands.migrate_image_store --gc    # delete files no row references
+
+Rows are moved in id order and committed per batch, so the command can be stopped and
+re-run; images are served from whichever store a row points at in the meantime.
+"""
+import argparse
+import os
+import time
+from sqlalchemy import tuple_
+from sqlalchemy.orm import undefer
+from .. import models
+from ..config import settings
+from ..database import SessionLocal
+from ..utils import blob_store
+
+
+def _move(db, model, key_columns, target, batch_size: int) -> int:
+    """Keyset pass over one table's rows that are not yet in `target`."""
+    moved, last_key = 0, None
+    key = tuple(key_columns)
+    while True:
+        query = db.query(model)\
+            .options(undefer(model.image_data))\
+            .filter(model.storage != target.name)
+        if last_key is not None:
+            query = query.filter(tuple_(*key) > last_key)
+        rows = query.order_by(*key).limit(batch_size).all()
+        if not rows:
+            break
+
+        for row in rows:
+            data = blob_store.get(row.storage).load(row)
+            row.image_data = target.save(data, row.content_hash)
+            row.storage = target.name
+        last_key = tuple(getattr(rows[-1], column.key) for column in key)
+        db.commit()
+        db.expunge_all()
+
+        moved += len(rows)
+        print(f"{model.__tablename__}: {moved} moved")
+    return moved
+
+
+def migrate(to: str, batch_size: int = 200):
+    target = blob_store.get(to)
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        missing = db.query(models.ProductImage.id).filter(models.ProductImage.content_hash.is_(None)).first()
+        if missing:
+            raise SystemExit("Some images have no content_hash yet, run migrations/002_product_image_metadata.sql first")
+
+        total = _move(db, models.ProductImage, [models.ProductImage.id], target, batch_size)
+        total += _move(db, models.ProductImageVariant,
+                       [models.ProductImageVariant.image_id, models.ProductImageVariant.name], target, batch_size)
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {total} blobs moved to {to} in {elapsed:.1f}s")
+    if to == "filesystem" and total:
+        print("Run VACUUM FULL product_images, product_image_variants; to give the freed bytea space back to the OS")
+    if settings.image_store != to:
+        print(f"Note: new uploads still go to {settings.image_store!r}; set IMAGE_STORE={to}")
+
+
+# Files younger than this are left alone by --gc: an upload writes its file before its row commits
+GC_MIN_AGE_SECONDS = 3600
+
+
+def gc() -> int:
+    """Deletes files in the filesystem store that no filesystem-backed row references."""
+    store = blob_store.STORES["filesystem"]
+    db = SessionLocal()
+    try:
+        referenced = {h for (h,) in db.query(models.ProductImage.content_hash)
+                      .filter(models.ProductImage.storage == store.name)}
+        referenced |= {h for (h,) in db.query(models.ProductImageVariant.content_hash)
+                       .filter(models.ProductImageVariant.storage == store.name)}
+    finally:
+        db.close()
+
+    removed, cutoff = 0, time.time() - GC_MIN_AGE_SECONDS
+    for dirpath, _, filenames in os.walk(store.root):
+        for filename in filenames:
+            # Leftover temp files from interrupted writes go too
+            path = os.path.join(dirpath, filename)
+            if filename not in referenced and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    print(f"Removed {removed} unreferenced files")
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--to", choices=list(blob_store.STORES))
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--gc", action="store_true", help="delete files in the filesystem store no row references")
+    args = parser.parse_args()
+    if not args.to and not args.gc:
+        parser.error("nothing to do: pass --to and/or --gc")
+
+    if args.to:
+        migrate(args.to, args.batch_size)
+    if args.gc:
+        gc()
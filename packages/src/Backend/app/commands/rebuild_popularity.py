@@ -0,0 +1,53 @@
+"""
+Recomputes product_popularity and category_popularity (trending scores, category units
+sold) from the order history. Needed once after migrations/004_popularity.sql, and to
+repair the scores if buffered sales were lost (a worker killed before its flush).
+
+Run from packages/src/Backend, preferably while no orders are being placed:
+    python -m app.commands.rebuild_popularity [--batch-size 10000]
+"""
+import argparse
+import time
+from .. import models
+from ..database import SessionLocal
+from ..utils import popularity
+
+
+def rebuild(batch_size: int = 10_000):
+    db = SessionLocal()
+    start = time.perf_counter()
+    total = 0
+    try:
+        # One transaction: readers keep the old scores until the new ones are complete
+        db.query(models.ProductPopularity).delete(synchronize_session=False)
+        db.query(models.CategoryPopularity).delete(synchronize_session=False)
+
+        rows = db.query(models.OrderItem.product_id, models.OrderItem.quantity, models.Orders.created_at)\
+            .join(models.Orders, models.Orders.id == models.OrderItem.order_id)\
+            .filter(models.Orders.status != "Cancelled", models.OrderItem.quantity > 0)\
+            .execution_options(yield_per=batch_size)
+
+        events = []
+        for row in rows:
+            events.append((row.product_id, row.quantity, popularity.offset(row.created_at)))
+            if len(events) >= batch_size:
+                popularity.apply_sales(db, events)
+                total += len(events)
+                events.clear()
+                print(f"{total} order items applied")
+        if events:
+            popularity.apply_sales(db, events)
+            total += len(events)
+        db.commit()
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {total} order items in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+    rebuild(args.batch_size)
@@ -12,6 +12,45 @@ class Settings(BaseSettings):
     database_name: str
     GEMINI_API_KEY: str
 
+    # Search
+    search_backend: str = "index"  # "index" (in-memory BM25F) or "fulltext" (Postgres tsvector)
+    search_cache_size: int = 1024
+    search_cache_ttl_seconds: int = 300
+
+    # Semantic search (faiss-cpu + sentence-transformers, CPU only)
+    embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    vector_index_path: str = "vector_index.faiss"
+    semantic_candidates: int = 200
+
+    # Product read cache (GET /product/{id}, search results); stock/sales/rating counters
+    # expire sooner. Set product_cache_redis_url to share it between workers.
+    product_cache_size: int = 20_000
+    product_cache_ttl_seconds: int = 600
+    product_cache_volatile_ttl_seconds: int = 10
+    product_cache_redis_url: str = ""
+
+    # Popularity (utils.popularity): trending = units sold, halved every trending_half_life_hours.
+    # Orders are buffered and applied every popularity_flush_seconds; search scores are
+    # multiplied by 1 + search_trending_weight * log(1 + trending units) (0 turns it off).
+    trending_half_life_hours: float = 72.0
+    popularity_flush_seconds: float = 30.0
+    search_trending_weight: float = 0.2
+
+    # Category tree snapshot (utils.category_tree): rebuilt after catalog writes in this
+    # worker, and at least this often to pick up other workers' writes.
+    category_tree_ttl_seconds: int = 60
+
+    # API responses: "orjson" renders every response with utils.fast_json.FastJSONResponse,
+    # "default" keeps FastAPI's own encoder. Payloads the app builds itself go through
+    # fast_json.trusted() unvalidated unless validate_trusted_responses is on.
+    json_response: str = "default"
+    validate_trusted_responses: bool = False
+
+    # Images: background workers building thumbnails / WebP variants
+    image_workers: int = 2
+    image_store: str = "database"  # "database" (bytea in product_images) or "filesystem" (content-addressed files)
+    image_store_path: str = "image_store"
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -2,10 +2,12 @@ from fastapi import FastAPI
 from . import models
 from .routers import cart, orders, product, user, search, reviews, categories
 from .database import engine
+from .utils import vector_index, image_variants, fast_json, popularity
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+# settings.json_response picks the encoder for every router (utils.fast_json)
+app = FastAPI(default_response_class=fast_json.response_class())
 
 app.include_router(user.router)
 app.include_router(product.router)
@@ -15,6 +17,31 @@ app.include_router(search.router)
 app.include_router(reviews.router)
 app.include_router(categories.router)
 
+@app.on_event("startup")
+def load_vector_index():
+    # Memory-map the persisted embedding index (if built) so semantic search starts warm
+    if vector_index.index.available:
+        vector_index.index.load()
+
+@app.on_event("shutdown")
+def save_vector_index():
+    if vector_index.index.available:
+        vector_index.index.save_if_dirty()
+
+@app.on_event("startup")
+def start_popularity_flusher():
+    popularity.sales.start()
+
+@app.on_event("shutdown")
+def stop_popularity_flusher():
+    # Apply the sales still buffered
+    popularity.sales.stop()
+
+@app.on_event("shutdown")
+def stop_image_workers():
+    # Let queued thumbnail jobs finish
+    image_variants.pool.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to VoiceCart!"}
\ No newline at end of file
@@ -1,8 +1,9 @@
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, JSON, DECIMAL, LargeBinary, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, Integer, String, Float, ForeignKey, JSON, DECIMAL, LargeBinary, Index, Computed, UniqueConstraint
+from sqlalchemy import DDL, event, select
+from sqlalchemy.orm import relationship, deferred, column_property
 from sqlalchemy.sql.expression import text
 from sqlalchemy.sql.sqltypes import TIMESTAMP
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from .database import Base
 
 class User(Base):
@@ -40,6 +41,19 @@ class Product(Base):
     num_reviews = Column(Integer, default=0, nullable=False)
     num_sold = Column(Integer, default=0, nullable=False)
 
+    # Denormalized copy of linked category names (space separated) so the generated
+    # search_vector can weight them; kept in sync by utils.products.sync_category_names
+    category_names = Column(String, nullable=True)
+
+    # Full-text search document: name A, brand B, categories C, description/specs D
+    search_vector = Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(brand_name, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(category_names, '')), 'C') || "
+        "setweight(to_tsvector('english', coalesce(description, '') || ' ' || coalesce(specs::text, '')), 'D')",
+        persisted=True
+    ))
+
     # REMOVED: image = Column(LargeBinary...) 
     # REASON: Storing blobs in the main table slows down every query.
     
@@ -49,11 +63,18 @@ class Product(Base):
     reviews = relationship("Reviews", back_populates="product", cascade="all, delete-orphan")
     cart = relationship("Cart", back_populates="product", cascade="all, delete-orphan")
     order_items = relationship("OrderItem", back_populates="product", cascade="all, delete-orphan")
+    spec_values = relationship("ProductSpecValue", back_populates="product", cascade="all, delete-orphan")
 
     # Optimization: Indexes for fast searching/filtering
     __table_args__ = (
         Index('idx_product_name_brand', 'name', 'brand_name'),
-        Index('idx_product_price', 'price'),
+        # (sort column, id): keyset pages of GET /categories/{id}/products, best sellers
+        # (GET /product/trending?sort=num_sold); price also serves the price filters
+        Index('idx_product_price', 'price', 'id'),
+        Index('idx_product_num_sold', 'num_sold', 'id'),
+        Index('idx_product_avg_rating', 'avg_rating', 'id'),
+        Index('idx_product_created_at', 'created_at', 'id'),
+        Index('idx_product_search_vector', 'search_vector', postgresql_using='gin'),
     )
 
 # NEW TABLE: Store heavy images separately
@@ -61,12 +82,70 @@ class ProductImage(Base):
     __tablename__ = "product_images"
     
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), nullable=False)
-    image_data = Column(LargeBinary, nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), nullable=False, index=True)
+    # Deferred: loading a ProductImage (e.g. joinedload(Product.images)) never pulls the blob.
+    # GET /product/{id}/images/{image_id} streams it in slices instead.
+    # NULL when the bytes live in the filesystem blob store (see utils.blob_store).
+    image_data = deferred(Column(LargeBinary, nullable=True))
+    storage = Column(String, nullable=False, default="database", server_default="database")  # "database" | "filesystem"
     is_primary = Column(Boolean, default=False) # To know which one to show in search results
+    content_hash = Column(String(64), nullable=True)  # sha256 hex of image_data, used as the ETag
+    content_type = Column(String, nullable=True)
+    size = Column(Integer, nullable=True)
     
     product = relationship("Product", back_populates="images")
 
+# Images are already compressed; store them uncompressed out of line so streaming reads
+# (substring slices) only touch the TOAST chunks they need
+event.listen(
+    ProductImage.__table__, "after_create",
+    DDL("ALTER TABLE product_images ALTER COLUMN image_data SET STORAGE EXTERNAL").execute_if(dialect="postgresql")
+)
+
+# Downscaled WebP copies of a ProductImage ("thumb", "medium"), built in the background
+# by utils.image_variants and served by the same image endpoint (?variant=thumb).
+class ProductImageVariant(Base):
+    __tablename__ = "product_image_variants"
+
+    image_id = Column(Integer, ForeignKey('product_images.id', ondelete="CASCADE"), primary_key=True)
+    name = Column(String, primary_key=True)
+    image_data = deferred(Column(LargeBinary, nullable=True))
+    storage = Column(String, nullable=False, default="database", server_default="database")
+    source_hash = Column(String(64), nullable=False)  # content_hash of the original it was made from
+    content_hash = Column(String(64), nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+
+# The primary image's id, loaded with every Product as a correlated subquery (product_id is
+# indexed), so list views can link a thumbnail without loading images at all
+Product.primary_image_id = column_property(
+    select(ProductImage.id)
+    .where(ProductImage.product_id == Product.id, ProductImage.is_primary == True)
+    .order_by(ProductImage.id)
+    .limit(1)
+    .correlate_except(ProductImage)
+    .scalar_subquery()
+)
+
+# Typed copy of Product.specs (one row per key) so spec filters are index range scans
+# instead of casting every row's JSON. Kept in sync by utils.products.sync_spec_values.
+class ProductSpecValue(Base):
+    __tablename__ = "product_spec_values"
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), primary_key=True)
+    key = Column(String, primary_key=True)
+    text_value = Column(String, nullable=True)
+    num_value = Column(Float, nullable=True)  # leading number of the value ("16GB" -> 16), if any
+
+    product = relationship("Product", back_populates="spec_values")
+
+    __table_args__ = (
+        Index('idx_spec_key_num', 'key', 'num_value'),
+        Index('idx_spec_key_text', 'key', 'text_value'),
+    )
+
 class Category(Base):
     __tablename__ = "categories"
 
@@ -86,6 +165,38 @@ class ProductCategory(Base):
     product = relationship("Product", back_populates="categories")
     category = relationship("Category", back_populates="products")
 
+    # The primary key leads with product_id; category listings look up by category first
+    __table_args__ = (
+        Index('idx_product_categories_category', 'category_id', 'product_id'),
+    )
+
+# Closure table of the category tree: one row per (ancestor, descendant) pair, including
+# each category with itself at depth 0. Subtrees (primary key) and ancestors (descendant
+# index) are one indexed read at any depth; maintained by utils.category_tree.
+class CategoryClosure(Base):
+    __tablename__ = "category_closure"
+
+    ancestor_id = Column(Integer, ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True, nullable=False)
+    descendant_id = Column(Integer, ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True, nullable=False)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('idx_category_closure_descendant', 'descendant_id', 'ancestor_id'),
+    )
+
+# Two-way search synonyms ("tv" <-> "television"), stored in analysed (normalised) form.
+# Used by utils.query_analysis to expand query terms.
+class SearchSynonym(Base):
+    __tablename__ = "search_synonyms"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True, nullable=False)
+    term = Column(String, nullable=False, index=True)
+    synonym = Column(String, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('term', 'synonym', name='uq_search_synonym'),
+    )
+
 class Cart(Base):
     __tablename__ = "cart"
 
@@ -120,6 +231,35 @@ class OrderItem(Base):
     order = relationship("Orders", back_populates="items")
     product = relationship("Product", back_populates="order_items")
 
+# Sales popularity, updated in batches from order events by utils.popularity.
+# trending_score is decayed sales in log space (see utils.popularity): ordering by it
+# is the trending order at any moment, so the index serves "top N trending" directly.
+# Kept out of products, where every UPDATE also recomputes the generated search_vector.
+class ProductPopularity(Base):
+    __tablename__ = "product_popularity"
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), primary_key=True)
+    trending_score = Column(Float, nullable=True)  # NULL once cancellations took back every sale
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'), nullable=False)
+
+    __table_args__ = (
+        Index('idx_product_popularity_trending', trending_score.desc(), 'product_id'),
+        Index('idx_product_popularity_updated', 'updated_at'),
+    )
+
+# Same per category (direct product links), plus all-time units sold
+class CategoryPopularity(Base):
+    __tablename__ = "category_popularity"
+
+    category_id = Column(Integer, ForeignKey('categories.id', ondelete="CASCADE"), primary_key=True)
+    num_sold = Column(Integer, nullable=False, default=0, server_default="0")
+    trending_score = Column(Float, nullable=True)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'), nullable=False)
+
+    __table_args__ = (
+        Index('idx_category_popularity_trending', trending_score.desc(), 'category_id'),
+    )
+
 class Reviews(Base):
     __tablename__ = "reviews"
 
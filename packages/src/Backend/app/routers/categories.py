@@ -1,20 +1,126 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import List
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select, exists, tuple_
+from sqlalchemy.orm import Session
+from typing import List, Optional
 from .. import models, schemas, database, oauth2
+from ..utils import catalog, category_tree, fast_json, popularity, pagination, product_cache, snapshots
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
-@router.get("/", response_model=List[schemas.CategoryOut])
+# GET /categories/{id}/products sort options: name -> (column, cursor value parser, default order).
+# Each has a (column, id) index on products, so a page is a walk down that index.
+PRODUCT_SORTS = {
+    "num_sold": (models.Product.num_sold, int, "desc"),
+    "price": (models.Product.price, Decimal, "asc"),
+    "avg_rating": (models.Product.avg_rating, Decimal, "desc"),
+    "created_at": (models.Product.created_at, datetime.fromisoformat, "desc"),
+}
+SORT_ORDERS = ("asc", "desc")
+
+
+@router.get("/", response_model=List[schemas.CategoryTreeOut])
 def get_all_categories(db: Session = Depends(database.get_db)):
-    # Optimized: Eager load children to prevent recursion queries
-    categories = db.query(models.Category)\
-        .options(joinedload(models.Category.children))\
-        .filter(models.Category.parent_id == None)\
+    """
+    The whole tree: ROOT categories with their children nested at every depth. Served
+    pre-rendered from the category_tree snapshot (no query unless it was rebuilt).
+    """
+    return fast_json.raw(category_tree.cache.get(db).json)
+
+@router.get("/trending", response_model=List[schemas.CategoryPopularityOut])
+def get_trending_categories(limit: int = Query(20, ge=1, le=100), db: Session = Depends(database.get_db)):
+    """Categories by recent sales of their products (decayed like GET /product/trending), with all-time units."""
+    score = models.CategoryPopularity.trending_score
+    rows = db.query(models.Category, models.CategoryPopularity.num_sold, score)\
+        .join(models.CategoryPopularity, models.CategoryPopularity.category_id == models.Category.id)\
+        .filter(score.isnot(None))\
+        .order_by(score.desc(), models.CategoryPopularity.category_id)\
+        .limit(limit)\
         .all()
-    # Note: This returns only ROOT categories, and Pydantic will nest the children.
-    # If you want a flat list of ALL categories, remove the .filter() line.
-    return categories
+    now = popularity.offset()
+    return [
+        schemas.CategoryPopularityOut(
+            id=category.id,
+            name=category.name,
+            parent_id=category.parent_id,
+            num_sold=num_sold,
+            trending_score=round(popularity.current(trending_score, now), 4)
+        )
+        for category, num_sold, trending_score in rows
+    ]
+
+@router.get("/{id}", response_model=schemas.CategoryTreeOut)
+def get_category(id: int, db: Session = Depends(database.get_db)):
+    """One category with its whole subtree nested under "children"."""
+    node = category_tree.cache.get(db, id).node(id)
+    if node is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return fast_json.trusted(node)
+
+@router.get("/{id}/products", response_model=List[schemas.ProductOutLite])
+def get_category_products(
+    id: int,
+    response: Response,
+    sort: str = "num_sold",
+    order: Optional[str] = None,
+    limit: int = pagination.DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    db: Session = Depends(database.get_db)
+):
+    """
+    Products in a category or any of its descendants, sorted by num_sold (default), price,
+    avg_rating or created_at (order=asc|desc, default best first / cheapest first).
+    Pass the X-Next-Cursor header back as ?cursor= for the next page. The page is an id
+    walk down the (sort column, id) index, checked against product_categories
+    (category_id, product_id) for the subtree's ids (from the category_tree snapshot);
+    the products come from pre-rendered snapshots.
+    """
+    if sort not in PRODUCT_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(PRODUCT_SORTS)}")
+    column, parse, default_order = PRODUCT_SORTS[sort]
+    order = order or default_order
+    if order not in SORT_ORDERS:
+        raise HTTPException(status_code=400, detail=f"order must be one of {', '.join(SORT_ORDERS)}")
+    limit = pagination.clamp_limit(limit)
+
+    category_ids = category_tree.cache.get(db, id).subtree(id)
+    if not category_ids:
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    in_category = exists().where(
+        models.ProductCategory.product_id == models.Product.id,
+        models.ProductCategory.category_id.in_(category_ids)
+    )
+    ids_query = db.query(models.Product.id, column.label("sort_value")).filter(in_category)
+
+    # Keyset seek on (sort column, id), both in the requested direction
+    if cursor:
+        cursor_sort, value, last_id = pagination.decode_cursor(cursor, 3)
+        if cursor_sort != f"{sort}:{order}":
+            raise HTTPException(status_code=400, detail="Cursor is for a different sort")
+        try:
+            key = tuple_(column, models.Product.id)
+            after = tuple_(parse(value), int(last_id))
+        except (TypeError, ValueError, InvalidOperation):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        ids_query = ids_query.filter(key > after if order == "asc" else key < after)
+
+    if order == "asc":
+        ids_query = ids_query.order_by(column, models.Product.id)
+    else:
+        ids_query = ids_query.order_by(column.desc(), models.Product.id.desc())
+
+    rows = ids_query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        value = last.sort_value.isoformat() if isinstance(last.sort_value, datetime) else str(last.sort_value)
+        pagination.set_page_headers(response, pagination.encode_cursor(f"{sort}:{order}", value, last.id))
+
+    ids = [row.id for row in rows]
+    rendered = product_cache.cache.get_snapshots(db, ids)
+    return snapshots.response(snapshots.array([rendered[pid] for pid in ids if pid in rendered]), response)
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.CategoryOut)
 def create_category(
@@ -27,13 +133,52 @@ def create_category(
     
     if db.query(models.Category).filter(models.Category.name == category.name).first():
         raise HTTPException(status_code=400, detail="Category exists")
+    if category.parent_id is not None and db.get(models.Category, category.parent_id) is None:
+        raise HTTPException(status_code=404, detail="Parent category not found")
        
     new_category = models.Category(**category.model_dump())
     db.add(new_category)
+    db.flush()
+    category_tree.add_categories(db, [new_category.id])
     db.commit()
     db.refresh(new_category)
+    catalog.bump()
     return new_category
 
+@router.patch("/{id}", response_model=schemas.CategoryOut)
+def move_category(
+    id: int,
+    move: schemas.CategoryMove,
+    db: Session = Depends(database.get_db),
+    current_user: schemas.UserOut = Depends(oauth2.get_current_user)
+):
+    """Moves a category, with everything below it, under another parent (null: to the top level)."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    category = db.get(models.Category, id)
+    if category is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    if move.parent_id == category.parent_id:
+        return category
+    if move.parent_id is not None:
+        if db.get(models.Category, move.parent_id) is None:
+            raise HTTPException(status_code=404, detail="Parent category not found")
+        if category_tree.is_descendant(db, move.parent_id, id):
+            raise HTTPException(status_code=400, detail="A category can't move under itself or its descendants")
+
+    category.parent_id = move.parent_id
+    category_tree.move_category(db, id, move.parent_id)
+    # Product payloads carry their categories' parent_id
+    product_ids = db.scalars(
+        select(models.ProductCategory.product_id).where(models.ProductCategory.category_id == id)
+    ).all()
+    db.commit()
+    db.refresh(category)
+    product_cache.cache.invalidate(product_ids)
+    catalog.bump()
+    return category
+
 # from fastapi import APIRouter, Depends, HTTPException, status
 # from sqlalchemy.orm import Session
 # from typing import List, Optional
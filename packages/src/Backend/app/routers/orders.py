@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 from .. import models, schemas, oauth2, database
+from ..utils import product_cache, popularity
 from . import cart
 from datetime import datetime, timedelta
 
@@ -70,8 +71,13 @@ def create_order(
     # 5. Clear Cart
     db.query(models.Cart).filter(models.Cart.user_id == current_user.id).delete()
     
+    sold = [(item.product_id, item.quantity) for item in cart_items]
+
     # 6. ONE FINAL COMMIT (All or Nothing)
     db.commit()
+    product_cache.cache.invalidate([product_id for product_id, _ in sold], ("stock", "num_sold"))
+    # Trending scores are applied in batches by the popularity flusher, not in this transaction
+    popularity.sales.record(sold)
     db.refresh(new_order)
     
     return new_order
@@ -128,6 +134,10 @@ def update_order(
         order.address = order_update.address
 
     db.commit()
+    if order.status == "Cancelled":
+        product_cache.cache.invalidate([item.product_id for item in order.items], ("stock", "num_sold"))
+        # Takes back what the sale added, weighted by when the order was placed
+        popularity.sales.record([(item.product_id, -item.quantity) for item in order.items], at=order.created_at)
     db.refresh(order)
     
     # Reload relationships for response
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import io
+from fastapi import APIRouter, Depends, File, HTTPException, Header, Query, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from typing import List, Optional
 from .. import models, schemas, database, oauth2
+from ..utils import search_index, vector_index, suggest, catalog, category_tree, pagination, images as image_utils, image_variants, blob_store, bulk_import, product_cache, snapshots, fast_json, popularity, filter as filter_utils, products as product_utils
 
 router = APIRouter(prefix="/product", tags=["product"])
 
+# Rows accepted by one PATCH /product/bulk request
+MAX_BULK_UPDATES = 50_000
+TRENDING_SORTS = ("trending", "num_sold")
+
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.ProductOutDetail)
 def create_product(
     product: schemas.ProductCreate, 
@@ -27,10 +35,11 @@ def create_product(
     if product.image:
         new_image = models.ProductImage(
             product_id=new_product.id,
-            image_data=product.image,
-            is_primary=True
+            is_primary=True,
+            **blob_store.blob_columns(product.image)
         )
         db.add(new_image)
+        db.flush()
 
     # 3. Handle Categories
     for category in categories:
@@ -38,6 +47,8 @@ def create_product(
         if not existing_category:
             existing_category = models.Category(name=category.name)
             db.add(existing_category)
+            db.flush()
+            category_tree.add_categories(db, [existing_category.id])
             db.commit()
             db.refresh(existing_category)
         
@@ -45,17 +56,116 @@ def create_product(
         product_category = models.ProductCategory(product_id=new_product.id, category_id=existing_category.id)
         db.add(product_category)
 
+    # Keep the denormalized category names (full-text search_vector) in sync with the links
+    product_utils.sync_category_names(db, [new_product.id])
+    product_utils.sync_spec_values(db, [new_product.id], {new_product.id: product.specs})
     db.commit()
     
     # 4. Return populated object
     # We must reload to get the relationships (categories/images) we just added
-    return get_product(new_product.id, db)
+    created = _load_product(new_product.id, db)
+    if product.image:
+        image_variants.pool.submit(new_image.id)
+    search_index.index.add_product(created)
+    vector_index.index.add_product(created)
+    suggest.index.add_product(created)
+    filter_utils.spec_keys.add(created.specs)
+    catalog.bump()
+    return created
+
+@router.post("/import", response_model=schemas.ImportReportOut)
+def bulk_import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="ndjson | csv (default: from the file name / content type)"),
+    db: Session = Depends(database.get_db),
+    current_user: schemas.UserOut = Depends(oauth2.get_current_user)
+):
+    """
+    Bulk catalog import from an NDJSON or CSV upload, one product per line/row
+    (schemas.ProductImport; CSV categories are "|" separated). Written in batches with
+    upserts instead of create_product's per-row commits. Invalid records are skipped and
+    listed in the report; rows_per_second says how fast it went.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+    fmt = format or bulk_import.guess_format(file.filename, file.content_type)
+    if fmt not in bulk_import.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(bulk_import.FORMATS)}")
+
+    # Read line by line from the spooled upload, never as one string
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    return bulk_import.import_products(db, lines, fmt)
+
+@router.get("/trending", response_model=List[schemas.ProductTrendingOut])
+def get_trending_products(
+    category: Optional[str] = None,
+    sort: str = "trending",
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Top sellers, optionally within one category (by name). sort=trending (default) ranks
+    by recent sales (trending_score: units sold, halved every trending_half_life_hours),
+    sort=num_sold by all-time units. Both are a walk down an index, no order_items scan.
+    """
+    if sort not in TRENDING_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(TRENDING_SORTS)}")
+
+    score = models.ProductPopularity.trending_score
+    if sort == "trending":
+        query = db.query(models.ProductPopularity.product_id.label("id"), score)\
+            .join(models.Product, models.Product.id == models.ProductPopularity.product_id)\
+            .filter(score.isnot(None))\
+            .order_by(score.desc(), models.ProductPopularity.product_id)
+    else:
+        query = db.query(models.Product.id, score)\
+            .outerjoin(models.ProductPopularity, models.ProductPopularity.product_id == models.Product.id)\
+            .filter(models.Product.num_sold > 0)\
+            .order_by(models.Product.num_sold.desc(), models.Product.id.desc())
+    query = query.filter(models.Product.for_sale == True)
+
+    if category:
+        category_id = db.query(models.Category.id).filter(models.Category.name == category).scalar()
+        if category_id is None:
+            raise HTTPException(status_code=404, detail="Category not found")
+        query = query.join(models.ProductCategory, and_(
+            models.ProductCategory.product_id == models.Product.id,
+            models.ProductCategory.category_id == category_id
+        ))
+
+    rows = query.limit(limit).all()
+    now = popularity.offset()
+    rendered = product_cache.cache.get_snapshots(db, [row.id for row in rows])
+    return snapshots.response(snapshots.array([
+        snapshots.extend(rendered[row.id], trending_score=round(popularity.current(row.trending_score, now), 4))
+        for row in rows
+        if row.id in rendered
+    ]))
+
+@router.get("/trending/stats")
+def get_trending_stats():
+    """Sales buffered in this worker and how many have been applied to the popularity tables."""
+    return popularity.sales.stats()
+
+@router.get("/cache/stats")
+def get_product_cache_stats():
+    return product_cache.cache.stats()
 
 @router.get("/{id}", response_model=schemas.ProductOutDetail)
 def get_product(id: int, db: Session = Depends(database.get_db)):
     """
-    Fetches FULL details including images.
+    Fetches FULL details including image metadata (image_data is deferred, never loaded here).
+    Served from the read-through product cache.
     """
+    product = product_cache.cache.get(db, id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    # Cached payloads are ProductOutDetail dumps already
+    return fast_json.trusted(product)
+
+def _load_product(id: int, db: Session) -> models.Product:
+    """The ORM row with categories and images loaded (for the in-memory indexes), uncached."""
     product = db.query(models.Product)\
         .options(
             joinedload(models.Product.categories).joinedload(models.ProductCategory.category),
@@ -70,25 +180,166 @@ def get_product(id: int, db: Session = Depends(database.get_db)):
 
 @router.get("/", response_model=List[schemas.ProductOutLite])
 def get_all_products(
+    response: Response,
     limit: int = 50, 
     skip: int = 0, 
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     db: Session = Depends(database.get_db)
 ):
     """
     Fetches LIGHT details (No massive image blobs) for fast listing.
+    Pass the X-Next-Cursor header back as ?cursor= for the next page (keyset on id,
+    so page N costs the same as page 1). ?skip= still works but degrades with depth.
+    The page is only an id scan; the products come from pre-rendered snapshots.
+    """
+    limit = pagination.clamp_limit(limit)
+    base_query = db.query(models.Product)
+
+    if include_total:
+        pagination.set_page_headers(response, None, pagination.estimate_count(db, base_query), estimated=True)
+
+    ids_query = db.query(models.Product.id).order_by(models.Product.id)
+
+    if cursor:
+        (last_id,) = pagination.decode_cursor(cursor, 1)
+        try:
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        ids_query = ids_query.filter(models.Product.id > last_id)
+    elif skip:
+        ids_query = ids_query.offset(skip)
+
+    ids = [row.id for row in ids_query.limit(limit + 1)]
+
+    if len(ids) > limit:
+        ids = ids[:limit]
+        pagination.set_page_headers(response, pagination.encode_cursor(ids[-1]))
+
+    rendered = product_cache.cache.get_snapshots(db, ids)
+    return snapshots.response(snapshots.array([rendered[pid] for pid in ids if pid in rendered]), response)
+
+@router.get("/{id}/images/{image_id}")
+def get_product_image(
+    id: int,
+    image_id: int,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    variant: Optional[str] = Query(None),
+    db: Session = Depends(database.get_db)
+):
     """
-    products = db.query(models.Product)\
-        .options(joinedload(models.Product.categories).joinedload(models.ProductCategory.category))\
-        .limit(limit).offset(skip)\
-        .all()
-    return products
+    Streams one product image. Strong ETag from the stored sha256 (304 on If-None-Match),
+    single byte ranges (206) for resumable / partial downloads.
+    ?variant=thumb|medium serves the downscaled WebP copy (the original until it is built).
+    """
+    if variant is not None and variant not in image_variants.VARIANTS:
+        raise HTTPException(status_code=400, detail=f"variant must be one of {', '.join(image_variants.VARIANTS)}")
+
+    image = db.query(
+        models.ProductImage.content_hash,
+        models.ProductImage.content_type,
+        models.ProductImage.size,
+        models.ProductImage.storage
+    ).filter(models.ProductImage.id == image_id, models.ProductImage.product_id == id).first()
+
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    model = models.ProductImage
+    criteria = [models.ProductImage.id == image_id]
+    if variant:
+        resized = db.query(
+            models.ProductImageVariant.content_hash,
+            models.ProductImageVariant.content_type,
+            models.ProductImageVariant.size,
+            models.ProductImageVariant.storage
+        ).filter(
+            models.ProductImageVariant.image_id == image_id,
+            models.ProductImageVariant.name == variant,
+            models.ProductImageVariant.source_hash == image.content_hash
+        ).first()
+        if resized:
+            image = resized
+            model = models.ProductImageVariant
+            criteria = [models.ProductImageVariant.image_id == image_id, models.ProductImageVariant.name == variant]
+    if image.content_hash is None:
+        # Rows from before migrations/002 have no metadata yet
+        raise HTTPException(status_code=409, detail="Image metadata missing, run migrations/002_product_image_metadata.sql")
+    store = blob_store.get(image.storage)
+    if not store.exists(image.content_hash):
+        raise HTTPException(status_code=404, detail="Image file missing from the blob store")
+
+    tag = image_utils.etag(image.content_hash)
+    headers = {
+        "ETag": tag,
+        "Cache-Control": image_utils.IMAGE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if image_utils.etag_matches(if_none_match, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # If-Range: only honour Range while the client's copy is still current
+    byte_range = None
+    if not if_range or if_range.strip() == tag:
+        byte_range = image_utils.parse_range(range_header, image.size)
+
+    if byte_range is None:
+        start, end, status_code = 0, image.size - 1, status.HTTP_200_OK
+    else:
+        (start, end), status_code = byte_range, status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{image.size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        store.iter_range(model, criteria, image.content_hash, start, end),
+        status_code=status_code,
+        media_type=image.content_type,
+        headers=headers
+    )
 
 @router.get("/stock/{id}")
 def get_product_stock(id: int, db: Session = Depends(database.get_db), current_user: schemas.UserOut = Depends(oauth2.get_current_user)):
-    product = db.query(models.Product.stock).filter(models.Product.id == id).first()
+    product = product_cache.cache.get_volatile(db, id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return {"stock": product.stock}
+    return {"stock": product["stock"]}
+
+@router.patch("/bulk", response_model=schemas.BulkUpdateOut)
+def bulk_update_products(
+    changes: List[schemas.ProductInventoryUpdate],
+    db: Session = Depends(database.get_db),
+    current_user: schemas.UserOut = Depends(oauth2.get_current_user)
+):
+    """
+    Inventory sync: price / stock / for_sale for many products at once, applied with
+    set-based UPDATE ... FROM (VALUES ...) statements in one transaction. Counts only.
+    (Declared before /{id} so "bulk" is not taken for an id.)
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if len(changes) > MAX_BULK_UPDATES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_UPDATES} changes per request")
+
+    # One row per id (a later change to the same id wins field by field), and only
+    # rows that change something
+    merged: dict[int, dict] = {}
+    for change in changes:
+        fields = change.model_dump(exclude_none=True, exclude={"id"})
+        if fields:
+            merged.setdefault(change.id, {"id": change.id}).update(fields)
+
+    updated = product_utils.bulk_update_inventory(db, list(merged.values()))
+    db.commit()
+
+    if updated:
+        search_index.index.update_prices(updated)
+        fields = {field for change in merged.values() for field in change} - {"id"}
+        product_cache.cache.invalidate(updated, fields)
+        catalog.bump()
+    return {"received": len(changes), "updated": len(updated), "not_found": len(merged) - len(updated)}
 
 @router.patch("/{id}", response_model=schemas.ProductOutDetail)
 def update_product(
@@ -122,17 +373,36 @@ def update_product(
             models.ProductImage.is_primary == True
         ).first()
 
+        columns = blob_store.blob_columns(product_update.image)
         if existing_image:
-            existing_image.image_data = product_update.image
+            for key, value in columns.items():
+                setattr(existing_image, key, value)
         else:
-            new_image = models.ProductImage(product_id=id, image_data=product_update.image, is_primary=True)
-            db.add(new_image)
+            existing_image = models.ProductImage(product_id=id, is_primary=True, **columns)
+            db.add(existing_image)
+        db.flush()
+        changed_image_id = existing_image.id
+    else:
+        changed_image_id = None
+
+    # 3. Keep the typed spec rows (used by spec filters) in sync
+    if "specs" in update_data:
+        product_utils.sync_spec_values(db, [id], {id: update_data["specs"]})
 
     db.commit()
     db.refresh(existing_product)
     
     # Reload with relationships
-    return get_product(id, db)
+    updated = _load_product(id, db)
+    product_cache.cache.invalidate([id])
+    if changed_image_id:
+        image_variants.pool.submit(changed_image_id)
+    search_index.index.add_product(updated)
+    vector_index.index.add_product(updated)
+    suggest.index.add_product(updated)
+    filter_utils.spec_keys.add(updated.specs)
+    catalog.bump()
+    return updated
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_product(id: int, db: Session = Depends(database.get_db), current_user: schemas.UserOut = Depends(oauth2.get_current_user)):
@@ -147,6 +417,11 @@ def delete_product(id: int, db: Session = Depends(database.get_db), current_user
     # deleting the associated Images and Categories automatically.
     db.delete(product)
     db.commit()
+    search_index.index.remove_product(id)
+    vector_index.index.remove_product(id)
+    suggest.index.remove_product(id)
+    product_cache.cache.invalidate([id])
+    catalog.bump()
     return
 
 
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session, joinedload
 from typing import List
 from .. import models, schemas, database, oauth2
+from ..utils import product_cache
 
 router = APIRouter(prefix="/reviews", tags=["review"])
 
@@ -63,6 +64,8 @@ def create_review(
     new_review = models.Reviews(**review.model_dump(), user_id=current_user.id)
     db.add(new_review)
     db.commit()
+    # Rating counters shown on the product
+    product_cache.cache.invalidate([review.product_id], ("avg_rating", "num_reviews"))
     db.refresh(new_review)
 
     # Reload with relationships for the schema response
@@ -186,6 +189,7 @@ def delete_review(id: int, db: Session = Depends(database.get_db), current_user:
     
     db.delete(review)
     db.commit()
+    product_cache.cache.invalidate([review.product_id], ("avg_rating", "num_reviews"))
     return {"detail": "Review deleted successfully"}
 
 @router.put("/{id}", response_model=schemas.ReviewOut)
@@ -204,10 +208,12 @@ def update_review(id: int, review: schemas.ReviewCreate, db: Session = Depends(d
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to update this review")
     
     # Update the review fields
+    product_ids = {existing_review.product_id, review.product_id}
     for key, value in review.model_dump().items():
         setattr(existing_review, key, value)
     
     db.commit()
+    product_cache.cache.invalidate(product_ids, ("avg_rating", "num_reviews"))
     db.refresh(existing_review)
     
     return existing_review
\ No newline at end of file
@@ -1,98 +1,518 @@
-# Build 3 - amazing
-
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, desc, case, cast, String
-from typing import List, Optional
-from .. import models, schemas, database
-from ..utils import filter as filter_utils
+# Build 4 - inverted index (+ optional Postgres full-text backend)
+
+from bisect import bisect_right
+from collections import defaultdict
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response, status
+from sqlalchemy.orm import Session
+from sqlalchemy import Float, cast, func, desc, or_, and_
+from typing import List
+from .. import models, schemas, database, oauth2
+from ..config import settings
+from ..utils import filter as filter_utils, search_index, search_cache, pagination, vector_index, metrics, suggest, catalog, query_analysis, product_cache, snapshots, fast_json, popularity
 
 router = APIRouter(prefix="/search", tags=["search"])
 
-# CHANGED: Use @router.post to accept the JSON body with filters/categories correctly
+DROPPED_FILTERS_HEADER = "X-Dropped-Filters"
+
+SEARCH_MODES = ("lexical", "semantic", "hybrid")
+# Reciprocal Rank Fusion constant for hybrid mode (the usual 60)
+RRF_K = 60
+MAX_BATCH_QUERIES = 50
+
+# A page is a list of (product_id, score, num_sold); the cursor is the last tuple on it,
+# plus the time the trending boost was decayed to (popularity.reference()).
+
+def _rank_with_index(db: Session, query: str, filters: dict | None, categories: List[str] | None):
+    """In-memory BM25F: candidates + scores without a DB scan, filters applied on candidate ids."""
+    search_index.index.ensure_built(db)
+    ranked = search_index.index.search(query, categories=categories)
+
+    # Apply Utility Filters on the candidate ids only (PK lookup, no text matching)
+    if ranked and filters:
+        id_query = db.query(models.Product.id).filter(models.Product.id.in_([pid for pid, *_ in ranked]))
+        allowed = {row.id for row in filter_utils.filter_products(id_query, categories=None, filters=filters)}
+        ranked = [item for item in ranked if item[0] in allowed]
+
+    return ranked
+
+def _rank_with_vectors(db: Session, query: str, filters: dict | None, categories: List[str] | None):
+    """Nearest products by embedding; categories/filters applied on the candidate ids."""
+    if not vector_index.index.available:
+        raise HTTPException(status_code=503, detail="Semantic search unavailable (install faiss-cpu and sentence-transformers)")
+
+    vector_index.index.ensure_loaded(db)
+    hits = vector_index.index.search(query, settings.semantic_candidates)
+    if not hits:
+        return []
+
+    id_query = db.query(models.Product.id, models.Product.num_sold)\
+        .filter(models.Product.id.in_([pid for pid, _ in hits]))
+    id_query = filter_utils.filter_products(id_query, categories=categories, filters=filters)
+    num_sold = {row.id: row.num_sold for row in id_query}
+
+    ranked = [(pid, score, num_sold[pid]) for pid, score in hits if pid in num_sold]
+    ranked.sort(key=search_index.rank_key)
+    return ranked
+
+def _rank_hybrid(db: Session, query: str, filters: dict | None, categories: List[str] | None):
+    """Reciprocal Rank Fusion of the BM25F and the vector rankings."""
+    fused, num_sold = defaultdict(float), {}
+    for ranked in (_rank_with_index(db, query, filters, categories),
+                   _rank_with_vectors(db, query, filters, categories)):
+        for position, (pid, _, sold) in enumerate(ranked):
+            fused[pid] += 1 / (RRF_K + position + 1)
+            num_sold[pid] = sold
+
+    ranked = [(pid, score, num_sold[pid]) for pid, score in fused.items()]
+    ranked.sort(key=search_index.rank_key)
+    return ranked
+
+RANKERS = {
+    "lexical": _rank_with_index,
+    "semantic": _rank_with_vectors,
+    "hybrid": _rank_hybrid,
+}
+
+def _cached_rank(db: Session, query: str, filters: dict | None, categories: List[str] | None,
+                 mode: str = "lexical", ref: float | None = None):
+    """
+    (ref, ranked): the full ranked list is cached, so every page (and the facets) reuse one
+    ranking; ref is the time its trending boost was decayed to. A cursor passes its ref
+    back: a cached ranking decayed to another time (recomputed since, another worker's)
+    would have different scores, so the ranking at the cursor's time is used instead.
+    """
+    popularity.scores.ensure_loaded(db)
+
+    def rank(at):
+        return at, popularity.scores.boost(RANKERS[mode](db, query, filters, categories), at)
+
+    cache_key = search_cache.cache.make_key(query, filters, categories, backend="index", mode=mode)
+    cached = search_cache.cache.get_or_compute(cache_key, lambda: rank(popularity.reference() if ref is None else ref))
+    if ref is None or cached[0] == ref:
+        return cached
+    cache_key = search_cache.cache.make_key(query, filters, categories, backend="index", mode=mode, ref=ref)
+    return search_cache.cache.get_or_compute(cache_key, lambda: rank(ref))
+
+def _cached_rank_many(db: Session, queries: List[str], filters: dict | None, categories: List[str] | None):
+    """
+    _cached_rank() for a batch of queries (lexical index), sharing its cache entries.
+    Misses are ranked in one index pass and filtered with one SQL query over all their candidates.
+    """
+    keys = {q: search_cache.cache.make_key(q, filters, categories, backend="index", mode="lexical") for q in queries}
+    ranked_by_key = {}
+    for key in set(keys.values()):
+        cached = search_cache.cache.get(key)
+        if cached is not None:
+            ranked_by_key[key] = cached
+
+    missing = list({keys[q]: q for q in queries if keys[q] not in ranked_by_key}.values())
+    if missing:
+        version = catalog.version()
+        search_index.index.ensure_built(db)
+        rankings = search_index.index.search_many(missing, categories=categories)
+
+        candidate_ids = {pid for ranked in rankings for pid, *_ in ranked}
+        if candidate_ids and filters:
+            id_query = db.query(models.Product.id).filter(models.Product.id.in_(candidate_ids))
+            allowed = {row.id for row in filter_utils.filter_products(id_query, categories=None, filters=filters)}
+            rankings = [[item for item in ranked if item[0] in allowed] for ranked in rankings]
+
+        popularity.scores.ensure_loaded(db)
+        ref = popularity.reference()
+        for query, ranked in zip(missing, rankings):
+            entry = (ref, popularity.scores.boost(ranked, ref))
+            search_cache.cache.put(keys[query], entry, version)
+            ranked_by_key[keys[query]] = entry
+
+    return [ranked_by_key[keys[q]][1] for q in queries]
+
+def _page_with_index(db: Session, query: str, filters: dict | None, categories: List[str] | None,
+                     after: list | None, limit: int, mode: str):
+    ref, ranked = _cached_rank(db, query, filters, categories, mode, ref=after[3] if after else None)
+
+    start = 0
+    if after:
+        score, num_sold, last_id, _ = after
+        start = bisect_right(ranked, (-score, -num_sold, last_id), key=search_index.rank_key)
+
+    page = ranked[start:start + limit]
+    has_more = start + limit < len(ranked)
+    return page, has_more, len(ranked), False, ref
+
+def _page_with_fulltext(db: Session, query: str, filters: dict | None, categories: List[str] | None,
+                        after: list | None, limit: int, include_total: bool):
+    """Postgres tsvector @@ tsquery over the GIN index, ranked with ts_rank_cd."""
+    query_analysis.synonyms.ensure_loaded(db)
+    analyzed = query_analysis.analyze(query)
+    if not analyzed.terms:
+        return [], False, 0, False, None
+
+    # OR the analysed terms and their synonyms together (like the old ilike path), allowing prefix matches
+    words = list(dict.fromkeys(analyzed.terms + sum(analyzed.synonyms, ())))
+    ts_query = func.to_tsquery('english', " | ".join(f"{w}:*" for w in words))
+    # ts_rank_cd is float4; the cursor carries the score as a float8, which a float4 never
+    # equals (and would skip every tie), so the rank is compared in double precision
+    rank = cast(func.ts_rank_cd(models.Product.search_vector, ts_query), Float(53))
+
+    sql_query = db.query(models.Product.id, models.Product.num_sold)\
+        .filter(models.Product.search_vector.op('@@')(ts_query))
+    ref = after[3] if after else popularity.reference()
+    if ref is not None:
+        # Same popularity boost as the index backend, from the stored scores
+        rank = popularity.boosted_rank(rank, models.ProductPopularity.trending_score, ref)
+        sql_query = sql_query.outerjoin(
+            models.ProductPopularity, models.ProductPopularity.product_id == models.Product.id
+        )
+    sql_query = sql_query.add_columns(rank.label("rank"))
+
+    if categories:
+        sql_query = sql_query.filter(models.Product.categories.any(
+            models.ProductCategory.category.has(models.Category.name.in_(categories))
+        ))
+
+    sql_query = filter_utils.filter_products(sql_query, categories=None, filters=filters)
+
+    total = pagination.estimate_count(db, sql_query) if include_total else None
+
+    # Keyset seek on (rank desc, num_sold desc, id asc)
+    if after:
+        score, num_sold, last_id, _ = after
+        sql_query = sql_query.filter(or_(
+            rank < score,
+            and_(rank == score, or_(
+                models.Product.num_sold < num_sold,
+                and_(models.Product.num_sold == num_sold, models.Product.id > last_id)
+            ))
+        ))
+
+    rows = sql_query.order_by(desc(rank), desc(models.Product.num_sold), models.Product.id)\
+        .limit(limit + 1)\
+        .all()
+    page = [(row.id, float(row.rank), row.num_sold) for row in rows[:limit]]
+    return page, len(rows) > limit, total, True, ref
+
 @router.post("/products", response_model=List[schemas.ProductSearchOut])
 def search_products(
-    # Use Body() to explicitly map JSON keys to arguments if needed, 
-    # but strictly matching keys works too.
-    query: str = Body(..., embed=True), # Expects {"query": "..."} inside body or handle as query param
-    # simpler: just accept a Pydantic model for the whole body, but let's stick to your structure:
-    # If client sends: { "query": "sony", "filters": {...}, "categories": [...] }
+    response: Response,
+    # If client sends: { "query": "sony", "filters": {...}, "categories": [...], "cursor": "...", "limit": 20 }
+    query: str = Body(..., embed=True),
     filters: dict = Body(None), 
     categories: List[str] = Body(None), 
+    cursor: str = Body(None),
+    limit: int = Body(pagination.DEFAULT_PAGE_SIZE),
+    include_total: bool = Body(False),
+    mode: str = Body("lexical"),
     db: Session = Depends(database.get_db)
 ):
-    if not query:
+    """
+    Ranked product search. The next page is fetched by sending back the X-Next-Cursor
+    response header as "cursor"; X-Total-Count is returned when include_total is set.
+    mode: "lexical" (default), "semantic" (embeddings) or "hybrid" (both, rank-fused).
+    """
+    if not query or not query.strip():
         raise HTTPException(status_code=400, detail="Query required")
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+
+    after = pagination.decode_cursor(cursor, 4) if cursor else None
+    if after:
+        score, num_sold, last_id, ref = after
+        try:
+            after = [float(score), int(num_sold), int(last_id), None if ref is None else float(ref)]
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = pagination.clamp_limit(limit)
+
+    # Report filters that were ignored (unknown field, bad value) instead of hiding them
+    dropped = filter_utils.compile_filters(db, filters).dropped
+    if dropped:
+        response.headers[DROPPED_FILTERS_HEADER] = ", ".join(f"{k} ({reason})" for k, reason in dropped.items())
+
+    # 1. Candidates + Scores (lexical backend chosen via settings.search_backend), cached per catalog version
+    use_fulltext = mode == "lexical" and settings.search_backend == "fulltext"
+    with metrics.search_latency.timed("fulltext" if use_fulltext else mode):
+        if use_fulltext:
+            cache_key = search_cache.cache.make_key(
+                query, filters, categories, backend="fulltext", cursor=cursor, limit=limit, include_total=include_total
+            )
+            page, has_more, total, estimated, ref = search_cache.cache.get_or_compute(
+                cache_key, lambda: _page_with_fulltext(db, query, filters, categories, after, limit, include_total)
+            )
+        else:
+            page, has_more, total, estimated, ref = _page_with_index(db, query, filters, categories, after, limit, mode)
+
+    if not page and not cursor:
+        raise HTTPException(status_code=404, detail="No products found")
 
-    query_str = query.strip()
-    words = query_str.split()
-    
-    # 1. Base Query - JOIN CATEGORIES immediately
-    sql_query = db.query(models.Product).join(models.Product.categories).join(models.ProductCategory.category)
-
-    # 2. Text Matching Logic
-    match_conditions = []
-    for word in words:
-        term = f"%{word}%"
-        match_conditions.append(models.Product.name.ilike(term))
-        match_conditions.append(models.Product.brand_name.ilike(term))
-        match_conditions.append(models.Product.description.ilike(term))
-        match_conditions.append(cast(models.Product.specs, String).ilike(term))
-        match_conditions.append(models.Category.name.ilike(term))
-
-    sql_query = sql_query.filter(or_(*match_conditions))
-
-    # --- THE FIX IS HERE ---
-    # Apply Category Filter manually on the EXISTING join
-    if categories:
-        sql_query = sql_query.filter(models.Category.name.in_(categories))
+    next_cursor = None
+    if page and has_more:
+        # page tuples are (id, score, num_sold); the cursor is (score, num_sold, id, boost time)
+        last_id, last_score, last_sold = page[-1]
+        next_cursor = pagination.encode_cursor(last_score, last_sold, last_id, ref)
+    pagination.set_page_headers(response, next_cursor, total if include_total else None, estimated)
+
+    # 2. Pre-rendered snapshots of only the rows on this page
+    rendered = product_cache.cache.get_snapshots(db, [pid for pid, *_ in page])
+
+    # 3. Splice in the score (keep ranked order; the score IS the sort key)
+    results = [
+        snapshots.extend(rendered[pid], relevance_score=score)
+        for pid, score, _ in page
+        if pid in rendered
+    ]
+    return snapshots.response(snapshots.array(results), response)
+
+@router.post("/products:batch", response_model=List[schemas.BatchSearchResultOut])
+def search_products_batch(
+    response: Response,
+    # { "queries": ["eggs", "milk", "bread"], "limit": 5, "filters": {...}, "categories": [...] }
+    queries: List[str] = Body(..., embed=True),
+    filters: dict = Body(None),
+    categories: List[str] = Body(None),
+    limit: int = Body(10),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Several searches in one request (shopping lists). Returns the top `limit` products
+    per query, in the order the queries were sent; a query with no match gets an empty list.
+    Filters/categories apply to every query.
+    """
+    queries = [q.strip() for q in queries if q and q.strip()]
+    if not queries:
+        raise HTTPException(status_code=400, detail="At least one query required")
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    limit = pagination.clamp_limit(limit)
+
+    dropped = filter_utils.compile_filters(db, filters).dropped
+    if dropped:
+        response.headers[DROPPED_FILTERS_HEADER] = ", ".join(f"{k} ({reason})" for k, reason in dropped.items())
+
+    with metrics.search_latency.timed("batch"):
+        pages = [ranked[:limit] for ranked in _cached_rank_many(db, queries, filters, categories)]
+
+    # One snapshot lookup for every product on every list
+    rendered = product_cache.cache.get_snapshots(db, [pid for page in pages for pid, *_ in page])
+
+    # BatchSearchResultOut, spliced: {"query": ..., "products": [ProductSearchOut, ...]}
+    results = [
+        b'{"query":' + snapshots.render(query) + b',"products":' + snapshots.array([
+            snapshots.extend(rendered[pid], relevance_score=score)
+            for pid, score, _ in page if pid in rendered
+        ]) + b"}"
+        for query, page in zip(queries, pages)
+    ]
+    return snapshots.response(snapshots.array(results), response)
+
+@router.post("/facets", response_model=schemas.SearchFacetsOut)
+def search_facets(
+    query: str = Body(..., embed=True),
+    filters: dict = Body(None), 
+    categories: List[str] = Body(None), 
+    db: Session = Depends(database.get_db)
+):
+    """
+    Facet counts (category, brand, price buckets, rating buckets) over the WHOLE match
+    set for the same body as POST /products. Uses the same cached candidate set, so
+    calling it next to a search costs one pass over the matches, not another search.
+    """
+    if not query or not query.strip():
+        raise HTTPException(status_code=400, detail="Query required")
 
-    # 3. Apply Utility Filters
-    # PASS categories=None to prevent filter_utils from joining the table a second time!
-    sql_query = filter_utils.filter_products(sql_query, categories=None, filters=filters)
+    _, ranked = _cached_rank(db, query, filters, categories)
+    counts = search_index.index.facets([pid for pid, *_ in ranked])
+
+    edges = search_index.PRICE_BUCKETS
+    return fast_json.trusted(schemas.SearchFacetsOut(
+        total=len(ranked),
+        categories=[schemas.FacetCount(value=k, count=v) for k, v in counts["categories"].most_common()],
+        brands=[schemas.FacetCount(value=k, count=v) for k, v in counts["brands"].most_common()],
+        price=[
+            schemas.PriceBucketCount(
+                min=edges[i],
+                max=edges[i + 1] if i + 1 < len(edges) else None,
+                count=counts["price"][i]
+            )
+            for i in sorted(counts["price"])
+        ],
+        rating=[schemas.RatingBucketCount(stars=k, count=counts["rating"][k]) for k in sorted(counts["rating"], reverse=True)],
+    ))
+
+@router.get("/suggest", response_model=List[schemas.SuggestionOut])
+def search_suggest(
+    prefix: str = Query(..., max_length=100),
+    limit: int = Query(10, ge=1, le=suggest.MAX_SUGGESTIONS),
+    db: Session = Depends(database.get_db)
+):
+    """Type-ahead: product names, brands and categories starting with `prefix`, best sellers first."""
+    suggest.index.ensure_built(db)
+    with metrics.search_latency.timed("suggest"):
+        suggestions = suggest.index.suggest(prefix, limit)
+    # Called on every keystroke; built here in the response shape, so not validated again
+    return fast_json.trusted([schemas.SuggestionOut(text=s.text, type=s.kind) for s in suggestions])
+
+@router.get("/synonyms", response_model=List[schemas.SynonymOut])
+def get_synonyms(db: Session = Depends(database.get_db)):
+    return db.query(models.SearchSynonym).order_by(models.SearchSynonym.term, models.SearchSynonym.synonym).all()
+
+@router.post("/synonyms", status_code=status.HTTP_201_CREATED, response_model=schemas.SynonymOut)
+def create_synonym(
+    synonym: schemas.SynonymCreate,
+    db: Session = Depends(database.get_db),
+    current_user: schemas.UserOut = Depends(oauth2.get_current_user)
+):
+    """Adds a two-way synonym. Both sides are stored analysed ("Televisions" -> "television")."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    term = query_analysis.analyze_text(synonym.term)
+    other = query_analysis.analyze_text(synonym.synonym)
+    if len(term) != 1 or len(other) != 1:
+        raise HTTPException(status_code=400, detail="Synonyms must be single words")
+    if term == other:
+        raise HTTPException(status_code=400, detail="A word cannot be its own synonym")
+
+    # One row per pair, whichever way round it was sent
+    term, other = sorted((term[0], other[0]))
+    if db.query(models.SearchSynonym).filter_by(term=term, synonym=other).first():
+        raise HTTPException(status_code=400, detail="Synonym exists")
+
+    new_synonym = models.SearchSynonym(term=term, synonym=other)
+    db.add(new_synonym)
+    db.commit()
+    db.refresh(new_synonym)
+
+    query_analysis.synonyms.ensure_loaded(db)
+    query_analysis.synonyms.add(term, other)
+    catalog.bump()
+    return new_synonym
+
+@router.delete("/synonyms/{id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_synonym(
+    id: int,
+    db: Session = Depends(database.get_db),
+    current_user: schemas.UserOut = Depends(oauth2.get_current_user)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
 
-    # 4. Scoring Algorithm
-    total_score = 0
-    for word in words:
-        term = f"%{word}%"
-        total_score += case((models.Product.name.ilike(term), 10), else_=0)
-        total_score += case((models.Product.brand_name.ilike(term), 6), else_=0)
-        total_score += case((models.Category.name.ilike(term), 4), else_=0)
-        total_score += case((models.Product.description.ilike(term), 2), else_=0)
-        total_score += case((cast(models.Product.specs, String).ilike(term), 2), else_=0)
+    synonym = db.query(models.SearchSynonym).filter(models.SearchSynonym.id == id).first()
+    if not synonym:
+        raise HTTPException(status_code=404, detail="Synonym not found")
 
-    # 5. Sort & Fetch
-    sql_query = sql_query.distinct().order_by(desc(total_score), desc(models.Product.num_sold))
+    db.delete(synonym)
+    db.commit()
 
-    results = sql_query.options(
-        joinedload(models.Product.categories).joinedload(models.ProductCategory.category)
-    ).limit(50).all()
+    query_analysis.synonyms.ensure_loaded(db)
+    query_analysis.synonyms.remove(synonym.term, synonym.synonym)
+    catalog.bump()
+    return
 
-    if not results:
-        raise HTTPException(status_code=404, detail="No products found")
+@router.get("/latency")
+def get_search_latency():
+    """p50/p95/p99 ranking latency (ms) over recent queries, per search mode/backend."""
+    return metrics.search_latency.summary()
 
-    # 6. Map to Schema
-    response = []
-    for p in results:
-        ui_score = 0
-        p_txt = (p.name + " " + (p.description or "") + " " + (p.brand_name or "") + " " + str(p.specs or "")).lower()
-        cat_names = " ".join([c.category.name for c in p.categories]).lower()
-        
-        for word in words:
-            w = word.lower()
-            if w in p.name.lower(): ui_score += 10
-            elif w in (p.brand_name or "").lower(): ui_score += 6
-            elif w in cat_names: ui_score += 4
-            elif w in p_txt: ui_score += 2
-
-        base_product = schemas.ProductOutLite.model_validate(p, from_attributes=True)
-        p_out = schemas.ProductSearchOut(
-            **base_product.model_dump(),
-            relevance_score=ui_score
-        )
-        response.append(p_out)
+@router.get("/cache/stats")
+def get_search_cache_stats():
+    """Hit/miss/eviction counters for sizing the search result cache."""
+    return search_cache.cache.stats()
+
+# Build 3 - amazing
+
+# from fastapi import APIRouter, Depends, HTTPException, Body
+# from sqlalchemy.orm import Session, joinedload
+# from sqlalchemy import or_, desc, case, cast, String
+# from typing import List, Optional
+# from .. import models, schemas, database
+# from ..utils import filter as filter_utils
+
+# router = APIRouter(prefix="/search", tags=["search"])
+
+# # CHANGED: Use @router.post to accept the JSON body with filters/categories correctly
+# @router.post("/products", response_model=List[schemas.ProductSearchOut])
+# def search_products(
+#     # Use Body() to explicitly map JSON keys to arguments if needed, 
+#     # but strictly matching keys works too.
+#     query: str = Body(..., embed=True), # Expects {"query": "..."} inside body or handle as query param
+#     # simpler: just accept a Pydantic model for the whole body, but let's stick to your structure:
+#     # If client sends: { "query": "sony", "filters": {...}, "categories": [...] }
+#     filters: dict = Body(None), 
+#     categories: List[str] = Body(None), 
+#     db: Session = Depends(database.get_db)
+# ):
+#     if not query:
+#         raise HTTPException(status_code=400, detail="Query required")
+
+#     query_str = query.strip()
+#     words = query_str.split()
+
+#     # 1. Base Query - JOIN CATEGORIES immediately
+#     sql_query = db.query(models.Product).join(models.Product.categories).join(models.ProductCategory.category)
+
+#     # 2. Text Matching Logic
+#     match_conditions = []
+#     for word in words:
+#         term = f"%{word}%"
+#         match_conditions.append(models.Product.name.ilike(term))
+#         match_conditions.append(models.Product.brand_name.ilike(term))
+#         match_conditions.append(models.Product.description.ilike(term))
+#         match_conditions.append(cast(models.Product.specs, String).ilike(term))
+#         match_conditions.append(models.Category.name.ilike(term))
+
+#     sql_query = sql_query.filter(or_(*match_conditions))
+
+#     # --- THE FIX IS HERE ---
+#     # Apply Category Filter manually on the EXISTING join
+#     if categories:
+#         sql_query = sql_query.filter(models.Category.name.in_(categories))
+
+#     # 3. Apply Utility Filters
+#     # PASS categories=None to prevent filter_utils from joining the table a second time!
+#     sql_query = filter_utils.filter_products(sql_query, categories=None, filters=filters)
+
+#     # 4. Scoring Algorithm
+#     total_score = 0
+#     for word in words:
+#         term = f"%{word}%"
+#         total_score += case((models.Product.name.ilike(term), 10), else_=0)
+#         total_score += case((models.Product.brand_name.ilike(term), 6), else_=0)
+#         total_score += case((models.Category.name.ilike(term), 4), else_=0)
+#         total_score += case((models.Product.description.ilike(term), 2), else_=0)
+#         total_score += case((cast(models.Product.specs, String).ilike(term), 2), else_=0)
+
+#     # 5. Sort & Fetch
+#     sql_query = sql_query.distinct().order_by(desc(total_score), desc(models.Product.num_sold))
+
+#     results = sql_query.options(
+#         joinedload(models.Product.categories).joinedload(models.ProductCategory.category)
+#     ).limit(50).all()
+
+#     if not results:
+#         raise HTTPException(status_code=404, detail="No products found")
 
-    return response
+#     # 6. Map to Schema
+#     response = []
+#     for p in results:
+#         ui_score = 0
+#         p_txt = (p.name + " " + (p.description or "") + " " + (p.brand_name or "") + " " + str(p.specs or "")).lower()
+#         cat_names = " ".join([c.category.name for c in p.categories]).lower()
+
+#         for word in words:
+#             w = word.lower()
+#             if w in p.name.lower(): ui_score += 10
+#             elif w in (p.brand_name or "").lower(): ui_score += 6
+#             elif w in cat_names: ui_score += 4
+#             elif w in p_txt: ui_score += 2
+
+#         base_product = schemas.ProductOutLite.model_validate(p, from_attributes=True)
+#         p_out = schemas.ProductSearchOut(
+#             **base_product.model_dump(),
+#             relevance_score=ui_score
+#         )
+#         response.append(p_out)
+
+#     return response
 
 # from fastapi import APIRouter, Depends, HTTPException
 # from sqlalchemy.orm import Session, joinedload
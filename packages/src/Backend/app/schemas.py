@@ -1,5 +1,5 @@
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, EmailStr, ConfigDict, field_validator
+from pydantic import BaseModel, EmailStr, ConfigDict, field_validator, computed_field
 from datetime import datetime
 
 # --- Token ---
@@ -22,10 +22,23 @@ class CategoryOut(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
+class CategoryMove(BaseModel):
+    parent_id: Optional[int]  # required: null moves the category to the top level
+
+class CategoryTreeOut(CategoryOut):
+    children: List["CategoryTreeOut"] = []
+
+class CategoryPopularityOut(CategoryOut):
+    num_sold: int
+    trending_score: float
+
 # --- Product Images ---
 class ProductImageOut(BaseModel):
     id: int
     product_id: int
+    is_primary: Optional[bool] = False
+    content_type: Optional[str] = None
+    size: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
 # --- Products ---
@@ -51,6 +64,38 @@ class ProductUpdate(BaseModel):
     brand_name: Optional[str] = None
     image: Optional[bytes] = None 
 
+# One row of PATCH /product/bulk (inventory sync); unset fields are left alone
+class ProductInventoryUpdate(BaseModel):
+    id: int
+    price: Optional[float] = None
+    stock: Optional[int] = None
+    for_sale: Optional[bool] = None
+
+class BulkUpdateOut(BaseModel):
+    received: int
+    updated: int
+    not_found: int
+
+# One record of a bulk import (POST /product/import, app.commands.import_products).
+# With an id the product is upserted, without one it is created.
+class ProductImport(ProductBase):
+    id: Optional[int] = None
+    categories: List[str] = []
+
+class ImportErrorOut(BaseModel):
+    line: int
+    detail: str
+
+class ImportReportOut(BaseModel):
+    rows: int
+    created: int
+    updated: int
+    categories_created: int
+    rejected: int
+    errors: List[ImportErrorOut] = []  # the first 100 (bulk_import.MAX_REPORTED_ERRORS)
+    seconds: float
+    rows_per_second: float
+
 # LITE Schema
 class ProductOutLite(ProductBase):
     id: int
@@ -59,9 +104,18 @@ class ProductOutLite(ProductBase):
     num_reviews: int
     num_sold: int
     categories: List[CategoryOut] = []
+    primary_image_id: Optional[int] = None
     
     model_config = ConfigDict(from_attributes=True)
 
+    @computed_field
+    @property
+    def thumbnail_url(self) -> Optional[str]:
+        """Small WebP preview of the primary image, for list views."""
+        if self.primary_image_id is None:
+            return None
+        return f"/product/{self.id}/images/{self.primary_image_id}?variant=thumb"
+
     # --- THE FIX IS HERE ---
     @field_validator('categories', mode='before')
     @classmethod
@@ -82,11 +136,66 @@ class ProductOutLite(ProductBase):
 
 # DETAIL Schema
 class ProductOutDetail(ProductOutLite):
-    pass 
+    # Metadata only; the bytes are served by GET /product/{id}/images/{image_id}
+    images: List[ProductImageOut] = []
+
+# The fast-changing part of a product (orders, reviews), cached separately by utils.product_cache
+class ProductVolatileOut(BaseModel):
+    stock: int
+    for_sale: bool
+    num_sold: int
+    avg_rating: float
+    num_reviews: int
+
+    model_config = ConfigDict(from_attributes=True)
 
 class ProductSearchOut(ProductOutLite):
     relevance_score: float
 
+# GET /product/trending: trending_score = units sold, decayed (utils.popularity)
+class ProductTrendingOut(ProductOutLite):
+    trending_score: float
+
+class BatchSearchResultOut(BaseModel):
+    query: str
+    products: List[ProductSearchOut] = []
+
+# --- Search Facets ---
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class PriceBucketCount(BaseModel):
+    min: float
+    max: Optional[float] = None  # None = open ended
+    count: int
+
+class RatingBucketCount(BaseModel):
+    stars: int  # 4 means 4.0 - 4.9
+    count: int
+
+class SearchFacetsOut(BaseModel):
+    total: int
+    categories: List[FacetCount] = []
+    brands: List[FacetCount] = []
+    price: List[PriceBucketCount] = []
+    rating: List[RatingBucketCount] = []
+
+class SuggestionOut(BaseModel):
+    text: str
+    type: str  # "product" | "brand" | "category"
+
+class SynonymCreate(BaseModel):
+    term: str
+    synonym: str
+
+class SynonymOut(BaseModel):
+    id: int
+    term: str
+    synonym: str
+
+    model_config = ConfigDict(from_attributes=True)
+
 # --- User ---
 class UserBase(BaseModel):
     email: EmailStr
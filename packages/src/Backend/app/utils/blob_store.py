@@ -0,0 +1,125 @@
+import mmap
+import os
+import tempfile
+from sqlalchemy import func
+from ..config import settings
+from ..database import SessionLocal
+from .images import IMAGE_CHUNK_SIZE, image_metadata
+
+# Where image bytes (ProductImage / ProductImageVariant) live. Each row records its own
+# `storage`, so both backends can be in use at once while blobs are being migrated
+# (app.commands.migrate_image_store). New uploads go to settings.image_store.
+
+
+class DatabaseBlobStore:
+    """Bytes in the row's image_data column (bytea), read back in substring() slices."""
+
+    name = "database"
+
+    def save(self, data: bytes, content_hash: str) -> bytes | None:
+        return data  # becomes the row's image_data
+
+    def load(self, row) -> bytes:
+        return row.image_data
+
+    def exists(self, content_hash: str) -> bool:
+        return True
+
+    def iter_range(self, model, criteria: list, content_hash: str, start: int, end: int):
+        # Own session: the request's session may be closed before the body is sent
+        db = SessionLocal()
+        try:
+            offset = start
+            while offset <= end:
+                length = min(IMAGE_CHUNK_SIZE, end - offset + 1)
+                chunk = db.query(func.substring(model.image_data, offset + 1, length))\
+                    .filter(*criteria)\
+                    .scalar()
+                if not chunk:
+                    break
+                yield bytes(chunk)
+                offset += length
+        finally:
+            db.close()
+
+
+class FileBlobStore:
+    """
+    Content-addressed files: <root>/ab/cd/abcd...(sha256). Identical uploads share one
+    file, writes are atomic (temp file + fsync + rename), reads are mmap slices served
+    from the page cache. Files are never rewritten; unreferenced ones are removed by
+    `migrate_image_store --gc`.
+    """
+
+    name = "filesystem"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], content_hash)
+
+    def exists(self, content_hash: str) -> bool:
+        return os.path.exists(self.path(content_hash))
+
+    def save(self, data: bytes, content_hash: str) -> bytes | None:
+        path = self.path(content_hash)
+        if os.path.exists(path):
+            os.utime(path)  # dedup: same bytes already stored; touched so --gc sees it as fresh
+            return None
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return None  # nothing kept in the row
+
+    def load(self, row) -> bytes:
+        with open(self.path(row.content_hash), "rb") as f:
+            return f.read()
+
+    def iter_range(self, model, criteria: list, content_hash: str, start: int, end: int):
+        if end < start:
+            return
+        with open(self.path(content_hash), "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            offset = start
+            while offset <= end:
+                stop = min(offset + IMAGE_CHUNK_SIZE, end + 1)
+                yield mapped[offset:stop]
+                offset = stop
+
+
+# defined globally so every request shares the same backends
+STORES = {
+    DatabaseBlobStore.name: DatabaseBlobStore(),
+    FileBlobStore.name: FileBlobStore(settings.image_store_path),
+}
+
+
+def get(name: str | None):
+    """The backend a row was written to (rows from before the storage column are in the database)."""
+    return STORES[name or DatabaseBlobStore.name]
+
+
+def current():
+    return STORES[settings.image_store]
+
+
+def blob_columns(data: bytes, store=None) -> dict:
+    """Writes data to the (current) store and returns the columns for its image row."""
+    store = store or current()
+    metadata = image_metadata(data)
+    return {
+        "image_data": store.save(data, metadata["content_hash"]),
+        "storage": store.name,
+        **metadata,
+    }
@@ -0,0 +1,259 @@
+import csv
+import json
+import time
+from typing import Iterable, Iterator
+from pydantic import ValidationError
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload
+from .. import models, schemas
+from . import products as product_utils, search_index, vector_index, suggest, catalog, category_tree, product_cache, filter as filter_utils
+
+# Bulk catalog import (POST /product/import, app.commands.import_products).
+# Records are streamed and written in batches: per batch one lookup + one insert for
+# categories, one executemany per table for products and links, one commit. A record
+# with an id is upserted (INSERT ... ON CONFLICT (id) DO UPDATE), without one it is created.
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+FORMATS = ("ndjson", "csv")
+# CSV: "categories" holds several names separated by this, specs are a JSON object
+# in a "specs" column and/or one "spec.<key>" column per key
+CATEGORY_SEPARATOR = "|"
+SPEC_COLUMN_PREFIX = "spec."
+
+PRODUCT_FIELDS = set(schemas.ProductBase.model_fields)
+
+# Moves the products id serial past every upserted id, never backwards (a concurrent
+# create may already have taken a higher value than max(id) shows)
+ADVANCE_ID_SEQUENCE = text(
+    "SELECT setval(seq, GREATEST((SELECT max(id) FROM products), pg_sequence_last_value(seq))) "
+    "FROM CAST(pg_get_serial_sequence('products', 'id') AS regclass) AS seq"
+)
+
+
+def guess_format(filename: str | None, content_type: str | None) -> str | None:
+    name, content_type = (filename or "").lower(), (content_type or "").lower()
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    return None
+
+
+def _ndjson_records(lines: Iterable[str]) -> Iterator[tuple[int, dict | str]]:
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, f"invalid JSON: {e}"
+
+
+def _csv_record(row: dict) -> dict:
+    record, specs = {}, {}
+    for key, value in row.items():
+        if key is None or value is None or value == "":
+            continue
+        if key == "specs":
+            specs.update(json.loads(value))
+        elif key.startswith(SPEC_COLUMN_PREFIX):
+            specs[key[len(SPEC_COLUMN_PREFIX):]] = value
+        elif key == "categories":
+            record["categories"] = [name.strip() for name in value.split(CATEGORY_SEPARATOR) if name.strip()]
+        else:
+            record[key] = value
+    if specs:
+        record["specs"] = specs
+    return record
+
+
+def _csv_records(lines: Iterable[str]) -> Iterator[tuple[int, dict | str]]:
+    reader = csv.DictReader(lines)
+    try:
+        for row in reader:
+            try:
+                yield reader.line_num, _csv_record(row)
+            except ValueError as e:
+                yield reader.line_num, f"invalid specs JSON: {e}"
+    except csv.Error as e:
+        # Malformed CSV (e.g. an unterminated quote): nothing after it can be trusted
+        yield reader.line_num, f"invalid CSV, import stopped: {e}"
+
+
+def read_records(lines: Iterable[str], fmt: str) -> Iterator[tuple[int, schemas.ProductImport | str]]:
+    """(line number, validated record or error message) for every record in the input."""
+    records = _ndjson_records(lines) if fmt == "ndjson" else _csv_records(lines)
+    for line_no, record in records:
+        if isinstance(record, str):
+            yield line_no, record
+            continue
+        try:
+            yield line_no, schemas.ProductImport.model_validate(record)
+        except ValidationError as e:
+            yield line_no, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.categories_created = 0
+        self.rejected = 0
+        self.errors: list[schemas.ImportErrorOut] = []
+        self.started = time.perf_counter()
+
+    def error(self, line: int, detail: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.ImportErrorOut(line=line, detail=detail))
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+    def out(self) -> schemas.ImportReportOut:
+        seconds = self.seconds
+        return schemas.ImportReportOut(
+            rows=self.rows,
+            created=self.created,
+            updated=self.updated,
+            categories_created=self.categories_created,
+            rejected=self.rejected,
+            errors=self.errors,
+            seconds=round(seconds, 3),
+            rows_per_second=round(self.rows / seconds, 1) if seconds else 0.0,
+        )
+
+
+def _resolve_categories(db: Session, names: set[str], category_ids: dict[str, int], report: ImportReport):
+    """Adds the ids of `names` to category_ids, creating the missing categories in one statement."""
+    names = names - category_ids.keys()
+    if not names:
+        return
+    found = db.execute(select(models.Category.id, models.Category.name).where(models.Category.name.in_(names))).all()
+    category_ids.update({name: id for id, name in found})
+
+    missing = names - category_ids.keys()
+    if missing:
+        created = db.execute(
+            pg_insert(models.Category)
+            .values([{"name": name} for name in sorted(missing)])
+            .on_conflict_do_nothing(index_elements=[models.Category.name])
+            .returning(models.Category.id, models.Category.name)
+        ).all()
+        report.categories_created += len(created)
+        category_ids.update({name: id for id, name in created})
+        category_tree.add_categories(db, [id for id, _ in created])
+
+        # Created concurrently by someone else between our lookup and insert
+        missing -= category_ids.keys()
+        if missing:
+            found = db.execute(select(models.Category.id, models.Category.name).where(models.Category.name.in_(missing))).all()
+            category_ids.update({name: id for id, name in found})
+
+
+def _import_batch(db: Session, batch: list[schemas.ProductImport], category_ids: dict[str, int],
+                  report: ImportReport, update_indexes: bool) -> list[int]:
+    _resolve_categories(db, {name for record in batch for name in record.categories}, category_ids, report)
+
+    # Same id twice in one batch: the last record wins (ON CONFLICT can't touch a row twice)
+    upserts = {record.id: record for record in batch if record.id is not None}
+    inserts = [record for record in batch if record.id is None]
+
+    records_by_id: dict[int, schemas.ProductImport] = {}
+    if upserts:
+        existing = set(db.scalars(select(models.Product.id).where(models.Product.id.in_(upserts))))
+        stmt = pg_insert(models.Product)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.Product.id],
+            set_={field: stmt.excluded[field] for field in PRODUCT_FIELDS}
+        )
+        db.execute(stmt, [record.model_dump(include=PRODUCT_FIELDS | {"id"}) for record in upserts.values()])
+        if existing:
+            # Re-imported products get exactly the categories listed now
+            db.query(models.ProductCategory)\
+                .filter(models.ProductCategory.product_id.in_(existing))\
+                .delete(synchronize_session=False)
+        report.updated += len(existing)
+        report.created += len(upserts) - len(existing)
+        records_by_id.update(upserts)
+        if db.bind.dialect.name == "postgresql":
+            # Before the inserts below (and any later create) draw from the serial
+            db.execute(ADVANCE_ID_SEQUENCE)
+
+    if inserts:
+        new_ids = db.scalars(
+            insert(models.Product).returning(models.Product.id, sort_by_parameter_order=True),
+            [record.model_dump(include=PRODUCT_FIELDS) for record in inserts]
+        ).all()
+        report.created += len(new_ids)
+        records_by_id.update(zip(new_ids, inserts))
+
+    links = [
+        {"product_id": product_id, "category_id": category_ids[name]}
+        for product_id, record in records_by_id.items()
+        for name in record.categories
+    ]
+    if links:
+        db.execute(pg_insert(models.ProductCategory).on_conflict_do_nothing(), links)
+
+    product_ids = list(records_by_id)
+    product_utils.sync_category_names(db, product_ids)
+    product_utils.sync_spec_values(db, product_ids, {pid: record.specs for pid, record in records_by_id.items()})
+    db.commit()
+    product_cache.cache.invalidate(upserts)
+
+    if update_indexes:
+        products = db.query(models.Product)\
+            .options(joinedload(models.Product.categories).joinedload(models.ProductCategory.category))\
+            .filter(models.Product.id.in_(product_ids))\
+            .all()
+        for product in products:
+            search_index.index.add_product(product)
+            suggest.index.add_product(product)
+            filter_utils.spec_keys.add(product.specs)
+        vector_index.index.add_products(products)
+        db.expunge_all()
+    return product_ids
+
+
+def import_products(
+    db: Session,
+    lines: Iterable[str],
+    fmt: str,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    update_indexes: bool = True,
+    progress=None
+) -> schemas.ImportReportOut:
+    """
+    Streams records from `lines` (NDJSON or CSV text) into the catalog. Invalid records are
+    skipped and reported by line; everything else is committed batch by batch.
+    `progress(report)` is called after every batch.
+    """
+    report = ImportReport()
+    category_ids: dict[str, int] = {}
+    batch: list[schemas.ProductImport] = []
+
+    def flush():
+        _import_batch(db, batch, category_ids, report, update_indexes)
+        report.rows += len(batch)
+        batch.clear()
+        if progress:
+            progress(report)
+
+    for line_no, record in read_records(lines, fmt):
+        if isinstance(record, str):
+            report.error(line_no, record)
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if report.rows:
+        catalog.bump()
+    return report.out()
@@ -0,0 +1,16 @@
+import threading
+
+# Monotonically increasing catalog version. Every product/category write bumps it,
+# and anything cached from catalog data (search results, ...) is only valid for the
+# version it was computed at.
+_lock = threading.Lock()
+_version = 0
+
+def version() -> int:
+    return _version
+
+def bump() -> int:
+    global _version
+    with _lock:
+        _version += 1
+        return _version
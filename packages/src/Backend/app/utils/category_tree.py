@@ -0,0 +1,156 @@
+import threading
+import time
+from typing import Iterable
+from sqlalchemy import Integer, delete, insert, literal, select, true, union_all
+from sqlalchemy.orm import Session
+from .. import models
+from ..config import settings
+from . import catalog, fast_json
+
+# The category tree in two forms:
+# - category_closure (models.CategoryClosure), every ancestor/descendant pair, kept up to
+#   date by add_categories() / move_category() in the same transaction as the write;
+# - CategoryTree, an immutable in-memory snapshot (nested payloads, subtree id lists, the
+#   rendered GET /categories/ body) built from two queries and swapped in whole.
+# Readers never walk parent_id one level at a time.
+
+CLOSURE_COLUMNS = ["ancestor_id", "descendant_id", "depth"]
+
+
+def add_categories(db: Session, category_ids: Iterable[int]):
+    """Closure rows for newly inserted categories (flushed, with their parents already in the table)."""
+    category_ids = list(category_ids)
+    if not category_ids:
+        return
+    closure = models.CategoryClosure.__table__
+    categories = models.Category.__table__
+    selves = select(
+        categories.c.id.label("ancestor_id"), categories.c.id.label("descendant_id"), literal(0, Integer)
+    ).where(categories.c.id.in_(category_ids))
+    ancestors = select(closure.c.ancestor_id, categories.c.id, closure.c.depth + 1)\
+        .select_from(categories.join(closure, closure.c.descendant_id == categories.c.parent_id))\
+        .where(categories.c.id.in_(category_ids))
+    db.execute(insert(closure).from_select(CLOSURE_COLUMNS, union_all(selves, ancestors)))
+
+
+def move_category(db: Session, category_id: int, parent_id: int | None):
+    """
+    Re-links the subtree under `category_id` below `parent_id` (None: top level). The caller
+    updates categories.parent_id and has checked that the parent isn't inside the subtree.
+    """
+    closure = models.CategoryClosure.__table__
+    subtree = select(closure.c.descendant_id).where(closure.c.ancestor_id == category_id)
+    # Detach: drop every path from outside the subtree into it
+    db.execute(
+        delete(closure)
+        .where(closure.c.descendant_id.in_(subtree), closure.c.ancestor_id.not_in(subtree))
+        .execution_options(synchronize_session=False)
+    )
+    if parent_id is None:
+        return
+    # Attach: every ancestor of the new parent (itself included) x every node of the subtree
+    above, below = closure.alias("above"), closure.alias("below")
+    db.execute(insert(closure).from_select(
+        CLOSURE_COLUMNS,
+        select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+        .select_from(above.join(below, true()))
+        .where(above.c.descendant_id == parent_id, below.c.ancestor_id == category_id)
+    ))
+
+
+def is_descendant(db: Session, category_id: int, ancestor_id: int) -> bool:
+    """True if category_id is ancestor_id or anywhere below it."""
+    closure = models.CategoryClosure
+    return db.query(closure.depth)\
+        .filter(closure.ancestor_id == ancestor_id, closure.descendant_id == category_id)\
+        .first() is not None
+
+
+class CategoryTree:
+    """
+    One immutable snapshot of the category tree. Node payloads are CategoryTreeOut dicts
+    nested through their "children" lists; nothing here is modified after __init__.
+    """
+
+    def __init__(self, categories: list, pairs: list, version: int):
+        self.version = version
+        self.built_at = time.monotonic()
+
+        nodes = {
+            c.id: {"id": c.id, "name": c.name, "parent_id": c.parent_id, "children": []}
+            for c in sorted(categories, key=lambda c: c.id)
+        }
+        roots = []
+        for node in nodes.values():
+            parent = nodes.get(node["parent_id"])
+            (parent["children"] if parent is not None else roots).append(node)
+
+        subtrees = {category_id: [category_id] for category_id in nodes}
+        for ancestor_id, descendant_id in pairs:
+            if ancestor_id in subtrees and descendant_id in nodes:
+                subtrees[ancestor_id].append(descendant_id)
+
+        self._nodes = nodes
+        self._subtrees = {category_id: tuple(ids) for category_id, ids in subtrees.items()}
+        self.json = fast_json.dumps(roots)
+
+    @classmethod
+    def load(cls, db: Session, version: int) -> "CategoryTree":
+        categories = db.query(models.Category.id, models.Category.name, models.Category.parent_id).all()
+        closure = models.CategoryClosure
+        pairs = db.query(closure.ancestor_id, closure.descendant_id)\
+            .filter(closure.depth > 0)\
+            .order_by(closure.ancestor_id, closure.depth, closure.descendant_id)\
+            .all()
+        return cls(categories, pairs, version)
+
+    def __contains__(self, category_id: int) -> bool:
+        return category_id in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def node(self, category_id: int) -> dict | None:
+        """The category's CategoryTreeOut payload, with everything below it."""
+        return self._nodes.get(category_id)
+
+    def subtree(self, category_id: int) -> tuple[int, ...]:
+        """The category and all its descendants, nearest first (empty if it doesn't exist)."""
+        return self._subtrees.get(category_id, ())
+
+
+class CategoryTreeCache:
+    """
+    Holds the current CategoryTree. A snapshot is good for the catalog version it was built
+    at (every category write bumps it) and at most category_tree_ttl_seconds, since other
+    workers' writes don't bump this one's version. Readers take the current snapshot
+    without locking; one rebuilds while the others wait for it.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._tree: CategoryTree | None = None
+
+    def _fresh(self, tree: CategoryTree | None) -> bool:
+        return tree is not None and tree.version == catalog.version() \
+            and time.monotonic() - tree.built_at < self.ttl_seconds
+
+    def get(self, db: Session, category_id: int | None = None) -> CategoryTree:
+        """
+        The current snapshot. With category_id, a category the snapshot doesn't have but the
+        database does (created by another worker since) triggers a rebuild.
+        """
+        tree = self._tree
+        if self._fresh(tree):
+            if category_id is None or category_id in tree or db.get(models.Category, category_id) is None:
+                return tree
+        with self._lock:
+            if self._tree is tree:  # nobody rebuilt it while we waited
+                # Version read before the queries: a write landing meanwhile leaves it stale
+                self._tree = CategoryTree.load(db, catalog.version())
+            return self._tree
+
+
+# defined globally so every request shares one snapshot
+cache = CategoryTreeCache(settings.category_tree_ttl_seconds)
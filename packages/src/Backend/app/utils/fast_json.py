@@ -0,0 +1,88 @@
+import json
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+from fastapi import Response
+from fastapi.datastructures import Default
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from ..config import settings
+
+try:
+    import orjson
+except ImportError:
+    logging.warning("orjson not available - fast JSON responses use the stdlib encoder")
+    orjson = None
+
+# JSON encoding for API responses.
+# Same output as FastAPI's JSONResponse (UTF-8, compact, no NaN), with Decimal (prices,
+# ratings straight from the ORM), datetimes and Pydantic models handled by the encoder,
+# so payloads don't have to go through jsonable_encoder first.
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    # orjson serializes these itself; the stdlib fallback needs them spelled out
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (stdlib fallback) and the Decimal/datetime/model hooks above."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def raw(body: bytes, sub_response: Response | None = None, status_code: int = 200) -> Response:
+    """
+    Wraps already-encoded JSON as the endpoint's response. Returning a Response skips the
+    route's response_model validation (it still documents the shape), so headers set on
+    the injected `response` (cursor, counts) are carried over here.
+    """
+    out = Response(content=body, status_code=status_code, media_type="application/json")
+    if sub_response is not None:
+        for name, value in sub_response.headers.items():
+            if name.lower() not in ("content-length", "content-type"):
+                out.headers[name] = value
+    return out
+
+
+def trusted(content, sub_response: Response | None = None, status_code: int = 200) -> Response:
+    """
+    Response for payloads the app built itself in the response_model's shape (schema
+    instances, cached payload dicts): encoded directly, without validating them again.
+    With settings.validate_trusted_responses on, the route's normal validation runs instead
+    (the content is returned as is), which is how to check a suspect endpoint.
+    """
+    if settings.validate_trusted_responses:
+        return content
+    return raw(dumps(content), sub_response, status_code)
+
+
+def response_class():
+    """
+    Default response class for the app (settings.json_response). "default" leaves FastAPI's
+    own choice in place: recent versions then serialize response models in pydantic-core
+    (dump_json), which an explicitly set class would switch off.
+    """
+    if settings.json_response == "orjson":
+        return FastJSONResponse
+    return Default(JSONResponse)
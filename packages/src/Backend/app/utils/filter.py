@@ -73,10 +73,179 @@
 #             results.append(product)
 #     return results
                 
-from sqlalchemy.orm import Query
-from sqlalchemy import and_, cast, Float, String, type_coerce
+import logging
+import threading
+from functools import lru_cache
+from sqlalchemy.orm import Query, Session
+from sqlalchemy import and_, exists, bindparam, Float, Integer, Numeric, Boolean
 from .. import models
 
+logger = logging.getLogger(__name__)
+
+# Suffix -> operation. A key with no known suffix is an exact match.
+OPS = {"_low": "low", "_high": "high", "_exact": "exact", "_contains": "contains"}
+
+# Plain Product columns that can be filtered on (relationships / blobs / tsvector are not)
+FILTERABLE_COLUMNS = {
+    c.key: c for c in models.Product.__table__.columns
+    if c.key not in ("specs", "search_vector", "category_names")
+}
+
+
+class SpecKeyRegistry:
+    """
+    Known keys of Product.specs, so a typo like "rma_low" is reported instead of
+    turning into a lookup that silently matches nothing.
+    Loaded once from product_spec_values (backfill with app.commands.backfill_spec_values),
+    then kept current by the product router.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: set[str] = set()
+        self._loaded = False
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded:
+            return
+        rows = db.query(models.ProductSpecValue.key).distinct().all()
+        with self._lock:
+            self._keys.update(row[0] for row in rows)
+            self._loaded = True
+
+    def add(self, specs: dict | None):
+        if specs:
+            with self._lock:
+                self._keys.update(specs.keys())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+
+# defined globally so every request shares one registry
+spec_keys = SpecKeyRegistry()
+
+
+class FilterPlan:
+    """
+    A compiled filter: one SQL clause with bind parameters (flt_0, flt_1, ...) plus the
+    values to bind. The clause depends only on the shape of the filter keys, so it is
+    built once and reused; SQLAlchemy's statement cache and Postgres see the same SQL.
+    """
+
+    def __init__(self, clause, params: dict, dropped: dict[str, str]):
+        self.clause = clause
+        self.params = params
+        self.dropped = dropped  # filter key -> reason it was ignored
+
+    def apply(self, query: Query) -> Query:
+        if self.clause is None:
+            return query
+        return query.filter(self.clause).params(**self.params)
+
+
+@lru_cache(maxsize=1024)
+def _parse_key(key: str) -> tuple[str, str]:
+    for suffix, op in OPS.items():
+        if key.endswith(suffix):
+            return key[:-len(suffix)], op
+    return key, "exact"
+
+
+def _coerce(column, op: str, value):
+    """Casts a filter value to what the column expects; raises ValueError if it can't."""
+    if op == "contains":
+        return f"%{value}%"
+    if column is None:
+        # specs: numbers for ranges, text for exact (values are stored as strings)
+        return float(value) if op in ("low", "high") else str(value)
+    if isinstance(column.type, Boolean):
+        if isinstance(value, str):
+            if value.lower() not in ("true", "false", "1", "0"):
+                raise ValueError("expected a boolean")
+            return value.lower() in ("true", "1")
+        return bool(value)
+    if isinstance(column.type, Integer):
+        return int(value)
+    if isinstance(column.type, (Numeric, Float)):
+        return float(value)
+    return value
+
+
+@lru_cache(maxsize=256)
+def _compile_shape(shape: tuple[tuple[str, str, bool], ...]):
+    """(field, op, is_spec) per accepted filter -> one AND-ed clause with bind params."""
+    conditions = []
+    for i, (field, op, is_spec) in enumerate(shape):
+        param = bindparam(f"flt_{i}")
+
+        if is_spec:
+            # Typed spec rows: (key, num_value) / (key, text_value) index lookups
+            spec = models.ProductSpecValue
+            target = spec.num_value if op in ("low", "high") else spec.text_value
+        else:
+            target = FILTERABLE_COLUMNS[field]
+
+        if op == "low":
+            condition = target < param
+        elif op == "high":
+            condition = target > param
+        elif op == "exact":
+            condition = target == param
+        else:
+            # ilike provides case-insensitive search
+            condition = target.ilike(param)
+
+        if is_spec:
+            condition = exists().where(
+                spec.product_id == models.Product.id,
+                spec.key == field,
+                condition
+            )
+        conditions.append(condition)
+
+    return and_(*conditions)
+
+
+def compile_filters(db: Session, filters: dict | None) -> FilterPlan:
+    """
+    Validates a filter dict and returns its (cached) plan plus the values to bind.
+    Unknown fields / spec keys and values that don't fit the column are dropped
+    and reported in plan.dropped rather than failing the whole request.
+    """
+    if not filters:
+        return FilterPlan(None, {}, {})
+
+    spec_keys.ensure_loaded(db)
+
+    shape, params, dropped = [], {}, {}
+    for key in sorted(filters):
+        field, op = _parse_key(key)
+        column = FILTERABLE_COLUMNS.get(field)
+        is_spec = column is None
+
+        if is_spec and field not in spec_keys:
+            dropped[key] = "unknown field"
+            continue
+        if op == "contains" and column is not None and column.type.python_type is not str:
+            dropped[key] = "contains only applies to text fields"
+            continue
+        try:
+            value = _coerce(column, op, filters[key])
+        except (TypeError, ValueError):
+            dropped[key] = "invalid value"
+            continue
+
+        params[f"flt_{len(shape)}"] = value
+        shape.append((field, op, is_spec))
+
+    if dropped:
+        logger.info(f"Dropped filters: {dropped}")
+
+    clause = _compile_shape(tuple(shape)) if shape else None
+    return FilterPlan(clause, params, dropped)
+
+
 def filter_products(query: Query, 
                     categories: list[str] | None = None, 
                     filters: dict | None = None) -> Query:
@@ -96,63 +265,91 @@ def filter_products(query: Query,
     if not filters:
         return query
 
-    # 2. Dynamic Attribute Filtering
-    conditions = []
-    
-    for key, value in filters.items():
-        # A. Determine operation (low, high, exact, contains)
-        field_name = key
-        op = "exact"
-        
-        if key.endswith("_low"):
-            field_name, op = key[:-4], "low"
-        elif key.endswith("_high"):
-            field_name, op = key[:-5], "high"
-        elif key.endswith("_exact"):
-            field_name, op = key[:-7], "exact"
-        elif key.endswith("_contains"):
-            field_name, op = key[:-9], "contains"
-
-        # B. Filter against standard columns (price, stock, etc.)
-        if hasattr(models.Product, field_name):
-            column = getattr(models.Product, field_name)
-            
-            if op == "low":
-                conditions.append(column < value)
-            elif op == "high":
-                conditions.append(column > value)
-            elif op == "exact":
-                conditions.append(column == value)
-            elif op == "contains":
-                # ilike provides case-insensitive search
-                conditions.append(column.ilike(f"%{value}%"))
-
-        # C. Filter against JSON 'specs' column
-        # Note: 'specs' is defined as JSON in your models.py
-        else:
-            # We treat the JSON field lookup differently depending on the DB type.
-            # This implementation assumes standard SQLAlchemy JSON access.
-            
-            # Access the JSON key
-            json_val = models.Product.specs[field_name]
-
-            if op == "exact":
-                # Cast to string for safe comparison (handling numbers stored as strings)
-                conditions.append(cast(json_val, String) == str(value))
-            elif op == "contains":
-                 conditions.append(cast(json_val, String).ilike(f"%{value}%"))
-            elif op in ["low", "high"]:
-                try:
-                    # Cast to Float for numeric comparison inside JSON
-                    # NOTE: This works best in PostgreSQL. SQLite JSON support varies.
-                    num_val = cast(json_val, Float)
-                    if op == "low": conditions.append(num_val < float(value))
-                    if op == "high": conditions.append(num_val > float(value))
-                except Exception:
-                    # If casting fails, we ignore this filter to prevent crashes
-                    pass
-
-    if conditions:
-        query = query.filter(and_(*conditions))
-
-    return query
\ No newline at end of file
+    # 2. Dynamic Attribute Filtering (compiled + cached plan)
+    return compile_filters(query.session, filters).apply(query)
+
+# Previous (uncompiled) version
+
+# from sqlalchemy.orm import Query
+# from sqlalchemy import and_, cast, Float, String, type_coerce
+# from .. import models
+
+# def filter_products(query: Query, 
+#                     categories: list[str] | None = None, 
+#                     filters: dict | None = None) -> Query:
+#     """
+#     Applies filters directly to the SQLAlchemy Query object.
+#     This prevents fetching unnecessary rows from the database.
+#     """
+
+#     # 1. Category Filter
+#     # Since Product <-> Category is Many-to-Many, we join the association tables
+#     if categories:
+#         query = query.join(models.Product.categories)\
+#                      .join(models.ProductCategory.category)\
+#                      .filter(models.Category.name.in_(categories))\
+#                      .distinct()
+
+#     if not filters:
+#         return query
+
+#     # 2. Dynamic Attribute Filtering
+#     conditions = []
+
+#     for key, value in filters.items():
+#         # A. Determine operation (low, high, exact, contains)
+#         field_name = key
+#         op = "exact"
+
+#         if key.endswith("_low"):
+#             field_name, op = key[:-4], "low"
+#         elif key.endswith("_high"):
+#             field_name, op = key[:-5], "high"
+#         elif key.endswith("_exact"):
+#             field_name, op = key[:-7], "exact"
+#         elif key.endswith("_contains"):
+#             field_name, op = key[:-9], "contains"
+
+#         # B. Filter against standard columns (price, stock, etc.)
+#         if hasattr(models.Product, field_name):
+#             column = getattr(models.Product, field_name)
+
+#             if op == "low":
+#                 conditions.append(column < value)
+#             elif op == "high":
+#                 conditions.append(column > value)
+#             elif op == "exact":
+#                 conditions.append(column == value)
+#             elif op == "contains":
+#                 # ilike provides case-insensitive search
+#                 conditions.append(column.ilike(f"%{value}%"))
+
+#         # C. Filter against JSON 'specs' column
+#         # Note: 'specs' is defined as JSON in your models.py
+#         else:
+#             # We treat the JSON field lookup differently depending on the DB type.
+#             # This implementation assumes standard SQLAlchemy JSON access.
+
+#             # Access the JSON key
+#             json_val = models.Product.specs[field_name]
+
+#             if op == "exact":
+#                 # Cast to string for safe comparison (handling numbers stored as strings)
+#                 conditions.append(cast(json_val, String) == str(value))
+#             elif op == "contains":
+#                  conditions.append(cast(json_val, String).ilike(f"%{value}%"))
+#             elif op in ["low", "high"]:
+#                 try:
+#                     # Cast to Float for numeric comparison inside JSON
+#                     # NOTE: This works best in PostgreSQL. SQLite JSON support varies.
+#                     num_val = cast(json_val, Float)
+#                     if op == "low": conditions.append(num_val < float(value))
+#                     if op == "high": conditions.append(num_val > float(value))
+#                 except Exception:
+#                     # If casting fails, we ignore this filter to prevent crashes
+#                     pass
+
+#     if conditions:
+#         query = query.filter(and_(*conditions))
+
+#     return query
@@ -0,0 +1,103 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .. import models
+from ..config import settings
+from ..database import SessionLocal
+from . import blob_store
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    logging.warning("Pillow not available - image thumbnails disabled")
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# name -> (longest side in px, WebP quality). List views use "thumb", detail pages "medium".
+VARIANTS = {
+    "thumb": (256, 75),
+    "medium": (800, 80),
+}
+
+
+def make_variant(data: bytes, max_side: int, quality: int) -> tuple[bytes, int, int]:
+    """Downscaled WebP copy of an image (never upscaled). Returns (bytes, width, height)."""
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        out = io.BytesIO()
+        img.save(out, format="WEBP", quality=quality, method=4)
+        return out.getvalue(), img.width, img.height
+
+
+def generate_variants(image_id: int):
+    """(Re)builds every variant of one ProductImage, unless they already match its current bytes."""
+    db = SessionLocal()
+    try:
+        image = db.query(models.ProductImage)\
+            .filter(models.ProductImage.id == image_id)\
+            .first()
+        if image is None:
+            return
+
+        existing = {
+            v.name: v.source_hash
+            for v in db.query(models.ProductImageVariant.name, models.ProductImageVariant.source_hash)
+                       .filter(models.ProductImageVariant.image_id == image_id)
+        }
+        if all(existing.get(name) == image.content_hash for name in VARIANTS):
+            return
+
+        original = blob_store.get(image.storage).load(image)
+        for name, (max_side, quality) in VARIANTS.items():
+            data, width, height = make_variant(original, max_side, quality)
+            db.merge(models.ProductImageVariant(
+                image_id=image_id,
+                name=name,
+                source_hash=image.content_hash,
+                width=width,
+                height=height,
+                **blob_store.blob_columns(data)
+            ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception(f"Generating variants for image {image_id} failed")
+    finally:
+        db.close()
+
+
+class VariantPool:
+    """
+    Background workers for thumbnail/WebP generation, so create/update requests return
+    without waiting on image decoding. Until a variant exists the image endpoint falls
+    back to the original.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def submit(self, image_id: int):
+        if not self.available:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-variants")
+        self._executor.submit(generate_variants, image_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# defined globally so every request shares one pool
+pool = VariantPool(settings.image_workers)
@@ -0,0 +1,77 @@
+import hashlib
+from fastapi import HTTPException
+
+# Product images are served by GET /product/{id}/images/{image_id}: streamed in slices
+# of the bytea column, with a strong ETag (sha256 of the bytes) and single-range support.
+
+IMAGE_CHUNK_SIZE = 256 * 1024
+IMAGE_CACHE_CONTROL = "public, max-age=3600"
+
+# Leading bytes -> MIME type, for the formats we expect from the admin UI
+MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def sniff_content_type(data: bytes) -> str:
+    for magic, content_type in MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def image_metadata(data: bytes) -> dict:
+    """Columns stored next to ProductImage.image_data so it never has to be read to describe it."""
+    return {
+        "content_hash": hashlib.sha256(data).hexdigest(),
+        "content_type": sniff_content_type(data),
+        "size": len(data),
+    }
+
+
+def etag(content_hash: str) -> str:
+    return f'"{content_hash}"'
+
+
+def etag_matches(header: str | None, current: str) -> bool:
+    """If-None-Match: "*" or any listed tag (weak comparison, as RFC 9110 asks for this header)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return current in tags
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Inclusive (start, end) for a single "bytes=" range, or None to send the whole body
+    (no header, a unit we don't know, or several ranges). 416 when nothing is satisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise ValueError
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    if end < start:
+        return None
+    return start, min(end, size - 1)
@@ -0,0 +1,50 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies per operation name, reported as p50/p95/p99."""
+
+    def __init__(self, window: int = 2000):
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._samples[name].append(seconds)
+
+    @contextmanager
+    def timed(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+
+        return {
+            name: {
+                "count": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+            }
+            for name, values in snapshot.items()
+        }
+
+
+# defined globally so every request shares one tracker
+search_latency = LatencyTracker()
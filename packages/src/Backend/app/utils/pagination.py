@@ -0,0 +1,54 @@
+import base64
+import json
+from fastapi import HTTPException, Response
+from sqlalchemy.orm import Query, Session
+
+# Keyset (cursor) pagination helpers.
+# A cursor is the sort key of the last row on the previous page, so fetching page N is
+# an index seek ("WHERE key > :last") instead of skipping N * limit rows.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_IS_ESTIMATE_HEADER = "X-Total-Count-Estimated"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decodes an opaque cursor back into its `size` key values (400 if tampered/stale)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def clamp_limit(limit: int | None) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+def estimate_count(db: Session, query: Query) -> int:
+    """
+    Planner row estimate for `query` (EXPLAIN, no execution), so a total can be shown
+    without a second full scan. Accurate enough for "about 12,000 results".
+    """
+    compiled = query.statement.compile(db.get_bind(), compile_kwargs={"render_postcompile": True})
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def set_page_headers(response: Response, next_cursor: str | None, total: int | None = None, estimated: bool = False):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if total is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+        response.headers[TOTAL_IS_ESTIMATE_HEADER] = "true" if estimated else "false"
@@ -0,0 +1,343 @@
+import logging
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+from sqlalchemy import bindparam, case, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from .. import models
+from ..config import settings
+from ..database import SessionLocal
+from . import search_index
+
+logger = logging.getLogger(__name__)
+
+# Trending = units sold with exponential decay: a unit sold `age` ago counts
+# 0.5 ** (age / trending_half_life_hours) now.
+#
+# Scores are stored as forward decay in log space:
+#     score = log(sum(quantity * e ** ((sold_at - EPOCH) / tau)))     tau = half life / ln 2
+# - a sale only adds its own term, so a batch of orders is one upsert, no re-reads;
+# - every score is relative to the same EPOCH, so ORDER BY score is the current trending
+#   order at any moment and an index on the column serves it;
+# - the log keeps e ** (...) from overflowing as time goes on.
+# The decayed value now is e ** (score - (now - EPOCH) / tau), see current().
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# Postgres raises on exp() underflow instead of returning 0
+MIN_EXPONENT = -700.0
+# A cancellation leaving less than this share of a score (float error) leaves nothing;
+# one worth more than the whole score by this share was never added (see _never_added)
+CANCEL_EPSILON = 1e-6
+
+# Wake the flusher early once this many sales are buffered
+FLUSH_AT_EVENTS = 5000
+# Past this (database down), the oldest buffered sales are dropped; rebuild_popularity repairs
+MAX_BUFFERED_EVENTS = 500_000
+# Re-read rows changed this long before the last sync: now() is the writing transaction's start
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def _tau_seconds() -> float:
+    return settings.trending_half_life_hours * 3600 / math.log(2)
+
+
+def offset(at: datetime | None = None) -> float:
+    """(at - EPOCH) / tau: the score of one unit sold at `at` (default now)."""
+    at = at or datetime.now(timezone.utc)
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return (at - EPOCH).total_seconds() / _tau_seconds()
+
+
+def current(score: float | None, now_offset: float | None = None) -> float:
+    """Decayed units sold as of now, from a stored score."""
+    if score is None:
+        return 0.0
+    return math.exp(score - (offset() if now_offset is None else now_offset))
+
+
+def _log_sum(terms: list[float]) -> float:
+    top = max(terms)
+    return top + math.log(sum(math.exp(term - top) for term in terms))
+
+
+def aggregate(events: Iterable[tuple[int, int, float]]) -> dict[int, tuple[int, float | None, float | None]]:
+    """
+    (key, quantity, offset) events -> {key: (net units, log-space score sold, log-space
+    score cancelled)}. Cancellations carry the original sale's offset, so they take back
+    exactly the weight that sale added.
+    """
+    units, sold, cancelled = defaultdict(int), defaultdict(list), defaultdict(list)
+    for key, quantity, at in events:
+        units[key] += quantity
+        (sold if quantity > 0 else cancelled)[key].append(at + math.log(abs(quantity)))
+    return {
+        key: (
+            units[key],
+            _log_sum(sold[key]) if key in sold else None,
+            _log_sum(cancelled[key]) if key in cancelled else None,
+        )
+        for key in units
+    }
+
+
+def _log_add(score, delta):
+    """log(e^score + e^delta) in SQL; score is NULL for rows without sales."""
+    return case(
+        (score.is_(None), delta),
+        else_=func.greatest(score, delta) + func.ln(1 + func.exp(func.greatest(-func.abs(score - delta), MIN_EXPONENT)))
+    )
+
+
+def _never_added(score, delta):
+    """
+    True when a cancellation outweighs everything stored: the order's sale was never counted
+    (placed before scores were tracked, and rebuild_popularity not run since).
+    """
+    return or_(score.is_(None), delta - score > CANCEL_EPSILON)
+
+
+def _log_sub(score, delta):
+    """
+    log(e^score - e^delta) in SQL; NULL once (up to float error) nothing is left. A sale
+    that was never added leaves the score as it is instead of wiping it.
+    """
+    return case(
+        (_never_added(score, delta), score),
+        (score - delta > CANCEL_EPSILON, score + func.ln(1 - func.exp(func.greatest(delta - score, MIN_EXPONENT)))),
+        else_=None
+    )
+
+
+def _write(db: Session, table, key, aggregated: dict, with_units: bool):
+    """One upsert for the sales, one executemany UPDATE for the cancellations."""
+    added = [
+        {key.name: k, "trending_score": sold, **({"num_sold": units} if with_units else {})}
+        for k, (units, sold, _) in aggregated.items() if sold is not None
+    ]
+    if added:
+        stmt = pg_insert(table)
+        set_ = {"trending_score": _log_add(table.c.trending_score, stmt.excluded.trending_score), "updated_at": func.now()}
+        if with_units:
+            set_["num_sold"] = func.greatest(table.c.num_sold + stmt.excluded.num_sold, 0)
+        db.execute(stmt.on_conflict_do_update(index_elements=[key], set_=set_), added)
+
+    removed = [
+        # Net units of keys that also sold in this batch went in with the upsert
+        {"b_key": k, "b_cancelled": cancelled, **({"b_units": 0 if sold is not None else units} if with_units else {})}
+        for k, (units, sold, cancelled) in aggregated.items() if cancelled is not None
+    ]
+    if removed:
+        cancelled = bindparam("b_cancelled")
+        values = {"trending_score": _log_sub(table.c.trending_score, cancelled), "updated_at": func.now()}
+        if with_units:
+            values["num_sold"] = case(
+                (_never_added(table.c.trending_score, cancelled), table.c.num_sold),
+                else_=func.greatest(table.c.num_sold + bindparam("b_units"), 0)
+            )
+        db.execute(update(table).where(key == bindparam("b_key")).values(values), removed)
+
+
+def apply_sales(db: Session, events: list[tuple[int, int, float]]):
+    """Folds (product_id, quantity, offset) events into product_popularity and category_popularity."""
+    products = aggregate(events)
+    links = db.execute(
+        select(models.ProductCategory.product_id, models.ProductCategory.category_id)
+        .where(models.ProductCategory.product_id.in_(products))
+    ).all()
+    categories_of = defaultdict(list)
+    for product_id, category_id in links:
+        categories_of[product_id].append(category_id)
+    categories = aggregate(
+        (category_id, quantity, at)
+        for product_id, quantity, at in events
+        for category_id in categories_of.get(product_id, ())
+    )
+
+    # Products deleted since the order was placed have nothing to update
+    existing = set(db.scalars(select(models.Product.id).where(models.Product.id.in_(products))))
+    products = {pid: value for pid, value in products.items() if pid in existing}
+
+    product_table = models.ProductPopularity.__table__
+    category_table = models.CategoryPopularity.__table__
+    _write(db, product_table, product_table.c.product_id, products, with_units=False)
+    _write(db, category_table, category_table.c.category_id, categories, with_units=True)
+
+
+class TrendingScores:
+    """
+    In-memory copy of product_popularity.trending_score for ranking search results.
+    Loaded on first use, then refreshed incrementally (rows changed since the last sync,
+    by any worker) after every flush.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scores: dict[int, float] = {}
+        self._loaded = False
+        self._synced_to = None
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._sync(db)
+                self._loaded = True
+
+    def sync(self, db: Session):
+        if self._loaded:
+            with self._lock:
+                self._sync(db)
+
+    def _sync(self, db: Session):
+        table = models.ProductPopularity
+        query = db.query(table.product_id, table.trending_score, table.updated_at)
+        if self._synced_to is not None:
+            query = query.filter(table.updated_at >= self._synced_to - SYNC_OVERLAP)
+        for row in query:
+            if row.trending_score is None:
+                self._scores.pop(row.product_id, None)
+            else:
+                self._scores[row.product_id] = row.trending_score
+            if self._synced_to is None or row.updated_at > self._synced_to:
+                self._synced_to = row.updated_at
+
+    def boost(self, ranked: list[tuple[int, float, int]], now: float | None) -> list[tuple[int, float, int]]:
+        """
+        Re-ranks (product_id, score, num_sold) search results with
+        score * (1 + search_trending_weight * log(1 + trending units)), the units decayed
+        to `now` (an offset(); None leaves the ranking as is, see reference()).
+        """
+        weight = settings.search_trending_weight
+        if now is None or not weight or not self._scores or not ranked:
+            return ranked
+        boosted = []
+        for product_id, score, num_sold in ranked:
+            trending = self._scores.get(product_id)
+            if trending is not None:
+                score *= 1 + weight * math.log1p(current(trending, now))
+            boosted.append((product_id, score, num_sold))
+        boosted.sort(key=search_index.rank_key)
+        return boosted
+
+
+def reference() -> float | None:
+    """
+    The time (an offset()) a new search ranking decays trending units to, None with the boost
+    off. Search cursors carry it, so every page of a query is ranked with the same boost
+    however much later it is fetched, and the keyset seek finds the ranks it left off at.
+    """
+    return offset() if settings.search_trending_weight else None
+
+
+def boosted_rank(rank, trending_score, now: float):
+    """SQL version of TrendingScores.boost for the full-text backend (outer join product_popularity)."""
+    units = func.exp(func.greatest(func.coalesce(trending_score - now, MIN_EXPONENT), MIN_EXPONENT))
+    return rank * (1 + settings.search_trending_weight * func.ln(1 + units))
+
+
+class SalesBuffer:
+    """
+    Order events waiting to be applied to product_popularity / category_popularity.
+    Checkout only appends here (no extra rows locked in the order transaction); a
+    background thread folds everything buffered into one upsert per table every
+    popularity_flush_seconds, then refreshes `scores` from the database.
+    """
+
+    def __init__(self, flush_seconds: float, scores: TrendingScores):
+        self.flush_seconds = flush_seconds
+        self.scores = scores
+        self._lock = threading.Lock()
+        self._events: list[tuple[int, int, float]] = []  # (product_id, quantity, offset)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.applied = 0
+        self.dropped = 0
+
+    def record(self, items: Iterable[tuple[int, int]], at: datetime | None = None):
+        """
+        (product_id, quantity) pairs sold at `at` (default now). Cancelling an order records
+        negative quantities with the order's original time.
+        """
+        at_offset = offset(at)
+        with self._lock:
+            self._events.extend((product_id, quantity, at_offset) for product_id, quantity in items if quantity)
+            pending = len(self._events)
+        if pending >= FLUSH_AT_EVENTS:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return
+
+        db = SessionLocal()
+        try:
+            apply_sales(db, events)
+            db.commit()
+            with self._lock:
+                self.flushes += 1
+                self.applied += len(events)
+        except Exception:
+            db.rollback()
+            logger.exception(f"Applying {len(events)} sales to popularity scores failed, will retry")
+            with self._lock:
+                self._events[:0] = events
+                overflow = len(self._events) - MAX_BUFFERED_EVENTS
+                if overflow > 0:
+                    del self._events[:overflow]
+                    self.dropped += overflow
+        finally:
+            db.close()
+
+    def tick(self):
+        self.flush()
+        db = SessionLocal()
+        try:
+            self.scores.sync(db)
+        except Exception:
+            logger.exception("Refreshing trending scores failed")
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.tick()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="popularity-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the thread and applies whatever is still buffered."""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._events),
+                "flushes": self.flushes,
+                "applied": self.applied,
+                "dropped": self.dropped,
+                "flush_seconds": self.flush_seconds,
+            }
+
+
+# defined globally so every request shares one buffer and one score table
+scores = TrendingScores()
+sales = SalesBuffer(settings.popularity_flush_seconds, scores)
@@ -0,0 +1,331 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+from sqlalchemy.orm import Session, joinedload
+from .. import models, schemas
+from ..config import settings
+from . import snapshots
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Fields that orders and reviews change all the time. They are cached in their own
+# short-lived entry, so a checkout only refetches these columns, not the whole product.
+VOLATILE_FIELDS = ("stock", "for_sale", "num_sold", "avg_rating", "num_reviews")
+VOLATILE_COLUMNS = [getattr(models.Product, field) for field in VOLATILE_FIELDS]
+
+# Lite payload = detail payload minus these
+DETAIL_ONLY_FIELDS = set(schemas.ProductOutDetail.model_fields) - set(schemas.ProductOutLite.model_fields)
+
+
+def _load_products(db: Session, product_ids: Iterable[int]) -> list[models.Product]:
+    return db.query(models.Product)\
+        .options(
+            joinedload(models.Product.categories).joinedload(models.ProductCategory.category),
+            joinedload(models.Product.images)
+        )\
+        .filter(models.Product.id.in_(list(product_ids)))\
+        .all()
+
+
+def _load_volatile(db: Session, product_ids: Iterable[int]) -> dict[int, dict]:
+    rows = db.query(models.Product.id, *VOLATILE_COLUMNS)\
+        .filter(models.Product.id.in_(list(product_ids)))\
+        .all()
+    return {row.id: schemas.ProductVolatileOut.model_validate(row).model_dump(mode="json") for row in rows}
+
+
+def _split(product: models.Product) -> tuple[dict, dict]:
+    """ORM product -> (stable part of the detail payload, volatile part)."""
+    payload = schemas.ProductOutDetail.model_validate(product).model_dump(mode="json")
+    volatile = {field: payload.pop(field) for field in VOLATILE_FIELDS}
+    return payload, volatile
+
+
+class _LocalStore:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_many(self, keys: list[str]) -> dict[str, dict]:
+        now, found = time.monotonic(), {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] < now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+        return found
+
+    def set_many(self, values: dict[str, dict], ttl: float):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete_many(self, keys: list[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _RedisStore:
+    """
+    Shared by every API worker, so an invalidation in one process is seen by all.
+    Size bound and eviction are Redis' own (run it with maxmemory + allkeys-lru).
+    """
+
+    PREFIX = "product-cache:"
+
+    def __init__(self, url: str):
+        self._client = redis.Redis.from_url(url)
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_many(self, keys: list[str]) -> dict[str, dict | bytes]:
+        if not keys:
+            return {}
+        values = self._client.mget([self.PREFIX + key for key in keys])
+        # Snapshots ("s:" keys) are already JSON bytes
+        return {
+            key: value if key.startswith("s:") else json.loads(value)
+            for key, value in zip(keys, values) if value is not None
+        }
+
+    def set_many(self, values: dict[str, dict | bytes], ttl: float):
+        pipe = self._client.pipeline(transaction=False)
+        for key, value in values.items():
+            pipe.set(self.PREFIX + key, value if isinstance(value, bytes) else json.dumps(value), ex=max(int(ttl), 1))
+        pipe.execute()
+
+    def delete_many(self, keys: list[str]):
+        if keys:
+            self._client.delete(*[self.PREFIX + key for key in keys])
+
+    def clear(self):
+        for key in self._client.scan_iter(self.PREFIX + "*"):
+            self._client.delete(key)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._client.scan_iter(self.PREFIX + "*"))
+
+
+class ProductCache:
+    """
+    Read-through cache of product payloads for GET /product/{id}, GET /product/stock/{id},
+    and (as snapshots) product lists and search results, agent searches included.
+
+    Each product is two entries: the serialized ProductOutDetail without VOLATILE_FIELDS
+    (long TTL, dropped by product writes) and the volatile fields (short TTL, also dropped
+    by order/review writes). A miss on the volatile entry alone is one narrow query.
+    A third entry, the ProductOutLite snapshot rendered to JSON bytes (utils.snapshots),
+    is built from those two and lives as long as the volatile one.
+    Entries live in-process (LRU) or, with product_cache_redis_url set, in Redis.
+    Writers call invalidate() after commit.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, volatile_ttl_seconds: float, redis_url: str = ""):
+        self.ttl_seconds = ttl_seconds
+        self.volatile_ttl_seconds = volatile_ttl_seconds
+        self._store = _LocalStore(max_entries)
+        if redis_url:
+            if redis is None:
+                logging.warning("redis not available - product cache stays in-process")
+            else:
+                self._store = _RedisStore(redis_url)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a read that started before one doesn't store
+        # what it loaded, since it may predate the write
+        self._generation = 0
+        self.hits = 0
+        self.snapshot_hits = 0
+        self.volatile_misses = 0
+        self.misses = 0
+
+    @staticmethod
+    def _keys(product_id: int) -> tuple[str, str]:
+        return f"p:{product_id}", f"v:{product_id}"
+
+    def get_snapshots(self, db: Session, product_ids: list[int]) -> dict[int, bytes]:
+        """{id: rendered ProductOutLite JSON} for the ids that exist."""
+        keys = {pid: f"s:{pid}" for pid in dict.fromkeys(product_ids)}
+        try:
+            found = self._store.get_many(list(keys.values()))
+        except Exception:
+            logger.exception("Product cache read failed")
+            found = {}
+        generation = self._generation
+
+        rendered = {pid: found[key] for pid, key in keys.items() if key in found}
+        missing = [pid for pid in keys if pid not in rendered]
+        with self._lock:
+            self.snapshot_hits += len(rendered)
+        if missing:
+            new = {pid: snapshots.render(payload) for pid, payload in self.get_many(db, missing, lite=True).items()}
+            rendered.update(new)
+            with self._lock:
+                current = generation == self._generation
+            if current and new:
+                try:
+                    self._store.set_many({keys[pid]: body for pid, body in new.items()}, self.volatile_ttl_seconds)
+                except Exception:
+                    logger.exception("Product cache write failed")
+        return rendered
+
+    def get_many(self, db: Session, product_ids: list[int], lite: bool = False) -> dict[int, dict]:
+        """{id: payload} for the ids that exist, as ProductOutDetail (or ProductOutLite) dicts."""
+        product_ids = list(dict.fromkeys(product_ids))
+        keys = [key for pid in product_ids for key in self._keys(pid)]
+        try:
+            found = self._store.get_many(keys)
+        except Exception:
+            logger.exception("Product cache read failed")
+            found = {}
+        generation = self._generation
+
+        stable = {pid: found.get(f"p:{pid}") for pid in product_ids}
+        volatile = {pid: found.get(f"v:{pid}") for pid in product_ids}
+        full_misses = [pid for pid in product_ids if stable[pid] is None]
+        volatile_misses = [pid for pid in product_ids if stable[pid] is not None and volatile[pid] is None]
+
+        new_stable, new_volatile = {}, {}
+        if full_misses:
+            for product in _load_products(db, full_misses):
+                stable[product.id], volatile[product.id] = _split(product)
+                new_stable[f"p:{product.id}"] = stable[product.id]
+                new_volatile[f"v:{product.id}"] = volatile[product.id]
+        if volatile_misses:
+            for pid, fields in _load_volatile(db, volatile_misses).items():
+                volatile[pid] = fields
+                new_volatile[f"v:{pid}"] = fields
+
+        with self._lock:
+            self.hits += len(product_ids) - len(full_misses) - len(volatile_misses)
+            self.misses += len(full_misses)
+            self.volatile_misses += len(volatile_misses)
+            current = generation == self._generation
+        if current and (new_stable or new_volatile):
+            try:
+                self._store.set_many(new_stable, self.ttl_seconds)
+                self._store.set_many(new_volatile, self.volatile_ttl_seconds)
+            except Exception:
+                logger.exception("Product cache write failed")
+
+        payloads = {}
+        for pid in product_ids:
+            if stable[pid] is None or volatile[pid] is None:
+                continue  # deleted, or gone between the two reads
+            payload = {**stable[pid], **volatile[pid]}
+            if lite:
+                for field in DETAIL_ONLY_FIELDS:
+                    payload.pop(field, None)
+            payloads[pid] = payload
+        return payloads
+
+    def get(self, db: Session, product_id: int, lite: bool = False) -> dict | None:
+        return self.get_many(db, [product_id], lite).get(product_id)
+
+    def get_volatile(self, db: Session, product_id: int) -> dict | None:
+        """Only the volatile fields (stock checks), without touching the full payload."""
+        _, key = self._keys(product_id)
+        try:
+            cached = self._store.get_many([key]).get(key)
+        except Exception:
+            logger.exception("Product cache read failed")
+            cached = None
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return cached
+
+        generation = self._generation
+        fields = _load_volatile(db, [product_id]).get(product_id)
+        with self._lock:
+            self.volatile_misses += 1
+            current = generation == self._generation
+        if fields is not None and current:
+            try:
+                self._store.set_many({key: fields}, self.volatile_ttl_seconds)
+            except Exception:
+                logger.exception("Product cache write failed")
+        return fields
+
+    def invalidate(self, product_ids: Iterable[int], fields: Iterable[str] | None = None):
+        """
+        Drops cached payloads after a write. `fields` names what changed: when they are all
+        volatile only the volatile entries go, otherwise (or with None) everything does.
+        """
+        volatile_only = fields is not None and set(fields) <= set(VOLATILE_FIELDS)
+        keys = []
+        for pid in product_ids:
+            stable_key, volatile_key = self._keys(pid)
+            keys.extend((volatile_key, f"s:{pid}"))
+            if not volatile_only:
+                keys.append(stable_key)
+        if not keys:
+            return
+        with self._lock:
+            self._generation += 1
+        try:
+            self._store.delete_many(keys)
+        except Exception:
+            logger.exception("Product cache invalidation failed")
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        self._store.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.volatile_misses
+            return {
+                "backend": "redis" if isinstance(self._store, _RedisStore) else "memory",
+                "entries": len(self._store),
+                "ttl_seconds": self.ttl_seconds,
+                "volatile_ttl_seconds": self.volatile_ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "volatile_misses": self.volatile_misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "snapshot_hits": self.snapshot_hits,
+                "evictions": self._store.evictions,
+                "expirations": self._store.expirations,
+            }
+
+
+# defined globally so every request shares one cache
+cache = ProductCache(
+    settings.product_cache_size,
+    settings.product_cache_ttl_seconds,
+    settings.product_cache_volatile_ttl_seconds,
+    settings.product_cache_redis_url
+)
@@ -1,3 +1,97 @@
+import re
+from sqlalchemy import select, func, insert, update, values, column, cast, Integer, Boolean, DECIMAL
+from sqlalchemy.orm import Session
+from .. import models
+
+LEADING_NUMBER_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)")
+
+
+def sync_category_names(db: Session, product_ids: list[int]):
+    """
+    Refreshes Product.category_names (which feeds the generated search_vector)
+    from the current ProductCategory links. Call after links change, before commit.
+    """
+    if not product_ids:
+        return
+
+    db.flush()
+    names = select(func.string_agg(models.Category.name, ' '))\
+        .join(models.ProductCategory, models.ProductCategory.category_id == models.Category.id)\
+        .where(models.ProductCategory.product_id == models.Product.id)\
+        .scalar_subquery()
+
+    db.query(models.Product)\
+        .filter(models.Product.id.in_(product_ids))\
+        .update({models.Product.category_names: names}, synchronize_session=False)
+
+
+def spec_value_rows(product_id: int, specs: dict | None) -> list[dict]:
+    """Product.specs -> rows for product_spec_values (text + parsed leading number)."""
+    rows = []
+    for key, value in (specs or {}).items():
+        text_value = None if value is None else str(value)
+        match = LEADING_NUMBER_RE.match(text_value or "")
+        rows.append({
+            "product_id": product_id,
+            "key": key,
+            "text_value": text_value,
+            "num_value": float(match.group(1)) if match else None,
+        })
+    return rows
+
+
+def sync_spec_values(db: Session, product_ids: list[int], specs_by_id: dict[int, dict | None]):
+    """
+    Replaces the typed spec rows for the given products. Call before commit whenever
+    Product.specs is written.
+    """
+    if not product_ids:
+        return
+
+    db.query(models.ProductSpecValue)\
+        .filter(models.ProductSpecValue.product_id.in_(product_ids))\
+        .delete(synchronize_session=False)
+
+    rows = [row for pid in product_ids for row in spec_value_rows(pid, specs_by_id.get(pid))]
+    if rows:
+        db.execute(insert(models.ProductSpecValue), rows)
+
+# Rows per UPDATE ... FROM (VALUES ...) statement in bulk_update_inventory
+INVENTORY_BATCH_SIZE = 1000
+INVENTORY_FIELDS = ("price", "stock", "for_sale")
+
+
+def bulk_update_inventory(db: Session, changes: list[dict]) -> dict[int, object]:
+    """
+    Applies {id, price?, stock?, for_sale?} changes with one set-based statement per batch:
+
+        UPDATE products SET price = coalesce(v.price, products.price), ...
+        FROM (VALUES (...), ...) AS v (id, price, stock, for_sale) WHERE products.id = v.id
+
+    A None field keeps the current value. Does not commit. Returns {id: price} of the
+    updated rows (ids that don't exist are simply not matched).
+    """
+    updated = {}
+    for i in range(0, len(changes), INVENTORY_BATCH_SIZE):
+        batch = changes[i:i + INVENTORY_BATCH_SIZE]
+        rows = values(
+            column("id", Integer), column("price", DECIMAL(10, 2)), column("stock", Integer), column("for_sale", Boolean),
+            name="v"
+        ).data([(c["id"], c.get("price"), c.get("stock"), c.get("for_sale")) for c in batch])
+
+        # Casts because an all-NULL VALUES column would otherwise be typed as text
+        stmt = update(models.Product)\
+            .where(models.Product.id == rows.c.id)\
+            .values(
+                price=func.coalesce(cast(rows.c.price, DECIMAL(10, 2)), models.Product.price),
+                stock=func.coalesce(cast(rows.c.stock, Integer), models.Product.stock),
+                for_sale=func.coalesce(cast(rows.c.for_sale, Boolean), models.Product.for_sale),
+            )\
+            .returning(models.Product.id, models.Product.price)\
+            .execution_options(synchronize_session=False)
+        updated.update(db.execute(stmt).tuples().all())
+    return updated
+
 # from sqlalchemy.orm import Session
 # from .. import models, schemas
 
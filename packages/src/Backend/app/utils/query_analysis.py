@@ -0,0 +1,165 @@
+import re
+import threading
+from functools import lru_cache
+from typing import NamedTuple
+from sqlalchemy.orm import Session
+from .. import models
+
+# Query analysis for (mostly spoken) search queries:
+#   "um, can you find me two litres of milk"  ->  terms ("2", "l", "milk")
+# tokenize -> drop filler/stopwords -> number words to digits, unit + plural normalisation,
+# plus synonym expansion from the search_synonyms table. Documents go through the same
+# unit + plural normalisation when indexed, so both sides meet on the same terms.
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Filler and request phrasing from voice transcripts; none of it identifies a product
+STOPWORDS = {
+    "um", "umm", "uh", "uhh", "hmm", "er", "erm", "ok", "okay", "so", "well", "please", "thanks",
+    "hey", "hi", "can", "could", "would", "will", "you", "me", "i", "im", "we", "my", "our",
+    "want", "wanna", "need", "looking", "look", "find", "show", "get", "give", "search", "buy",
+    "order", "add", "some", "any", "something", "anything", "a", "an", "the", "of", "to", "for",
+    "and", "or", "in", "on", "is", "are", "it", "that", "this", "there", "have", "has", "do", "let",
+    "see", "just", "also", "maybe", "like",
+}
+
+NUMBER_WORDS = {
+    "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6",
+    "seven": "7", "eight": "8", "nine": "9", "ten": "10", "eleven": "11", "twelve": "12",
+    "fifteen": "15", "twenty": "20", "thirty": "30", "forty": "40", "fifty": "50",
+    "hundred": "100", "thousand": "1000", "dozen": "12", "couple": "2",
+}
+
+# Spelled-out / abbreviated units -> the short form used in specs ("500 g", "16 GB")
+UNITS = {
+    "l": "l", "ltr": "l", "ltrs": "l", "litre": "l", "litres": "l", "liter": "l", "liters": "l",
+    "ml": "ml", "millilitre": "ml", "millilitres": "ml", "milliliter": "ml", "milliliters": "ml",
+    "g": "g", "gm": "g", "gms": "g", "gram": "g", "grams": "g", "gramme": "g", "grammes": "g",
+    "kg": "kg", "kgs": "kg", "kilo": "kg", "kilos": "kg", "kilogram": "kg", "kilograms": "kg",
+    "gb": "gb", "gig": "gb", "gigs": "gb", "gigabyte": "gb", "gigabytes": "gb",
+    "tb": "tb", "terabyte": "tb", "terabytes": "tb",
+    "mah": "mah", "w": "w", "watt": "w", "watts": "w",
+    "mp": "mp", "megapixel": "mp", "megapixels": "mp",
+}
+UNIT_TERMS = set(UNITS.values())
+# "16gb", "2l", "500ml": a number glued to a unit
+NUMBER_UNIT_RE = re.compile(r"(\d+)([a-z]+)")
+
+# Analysed queries remembered per raw query string
+ANALYZE_CACHE_SIZE = 4096
+
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+def stem(token: str) -> str:
+    """Light plural stemmer: phones -> phone, batteries -> battery, boxes -> box."""
+    if len(token) <= 3 or not token.endswith("s") or token[-2].isdigit():
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith(("sses", "ches", "shes", "xes", "zes")):
+        return token[:-2]
+    if token.endswith(("ss", "us", "is")):
+        return token
+    return token[:-1]
+
+
+def normalize_tokens(tokens: list[str]) -> list[str]:
+    """Number word, unit and plural normalisation, applied to documents and queries alike."""
+    out = []
+    for token in tokens:
+        token = NUMBER_WORDS.get(token, token)
+        match = NUMBER_UNIT_RE.fullmatch(token)
+        if match and match.group(2) in UNITS:
+            out.extend((match.group(1), UNITS[match.group(2)]))
+        elif token in UNITS:
+            out.append(UNITS[token])
+        else:
+            out.append(stem(token))
+    return out
+
+
+def is_exact_only(term: str) -> bool:
+    """Numbers and units are matched exactly, never as prefixes or fuzzily."""
+    return term.isdigit() or term in UNIT_TERMS
+
+
+def analyze_text(text: str | None) -> list[str]:
+    """Index-side analysis: every token kept, normalised."""
+    return normalize_tokens(tokenize(text))
+
+
+class SynonymRegistry:
+    """
+    Two-way synonyms from the search_synonyms table ("tv" <-> "television").
+    Loaded once, then kept current by the synonym endpoints; `version` moves on every
+    change so analysed queries cached under the old synonyms are not reused.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._synonyms: dict[str, set[str]] = {}
+        self._loaded = False
+        self.version = 0
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded:
+            return
+        rows = db.query(models.SearchSynonym.term, models.SearchSynonym.synonym).all()
+        with self._lock:
+            for term, synonym in rows:
+                self._link(term, synonym)
+            self._loaded = True
+            self.version += 1
+
+    def _link(self, term: str, synonym: str):
+        self._synonyms.setdefault(term, set()).add(synonym)
+        self._synonyms.setdefault(synonym, set()).add(term)
+
+    def add(self, term: str, synonym: str):
+        with self._lock:
+            self._link(term, synonym)
+            self.version += 1
+
+    def remove(self, term: str, synonym: str):
+        with self._lock:
+            for a, b in ((term, synonym), (synonym, term)):
+                linked = self._synonyms.get(a)
+                if linked:
+                    linked.discard(b)
+                    if not linked:
+                        del self._synonyms[a]
+            self.version += 1
+
+    def get(self, term: str) -> tuple[str, ...]:
+        return tuple(sorted(self._synonyms.get(term, ())))
+
+
+# defined globally so every request shares one registry
+synonyms = SynonymRegistry()
+
+
+class AnalyzedQuery(NamedTuple):
+    terms: tuple[str, ...]
+    synonyms: tuple[tuple[str, ...], ...]  # per term, in the same order
+
+
+def analyze(query: str | None) -> AnalyzedQuery:
+    return _analyze(query or "", synonyms.version)
+
+
+@lru_cache(maxsize=ANALYZE_CACHE_SIZE)
+def _analyze(query: str, synonyms_version: int) -> AnalyzedQuery:
+    tokens = tokenize(query)
+    # "i" is kept only when it can join the next word ("i phone" -> iphone)
+    kept = [
+        t for t, nxt in zip(tokens, tokens[1:] + [""])
+        if t not in STOPWORDS or (t == "i" and nxt and nxt not in STOPWORDS)
+    ]
+    # "find me some" on its own: keep what was said rather than searching for nothing
+    terms = tuple(dict.fromkeys(normalize_tokens(kept or tokens)))
+    return AnalyzedQuery(terms, tuple(synonyms.get(t) for t in terms))
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+from ..config import settings
+from . import catalog
+from . import query_analysis
+
+
+class SearchCache:
+    """
+    LRU + TTL cache for ranked search results.
+
+    Keys are the normalized (query, filters, categories) so "Milk", "milk " and
+    "um, find me some milk" share an entry. Every entry remembers the catalog version it was computed
+    at and is dropped as soon as the catalog changes, so results are never served
+    across a product/category write.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[float, int, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0      # dropped by LRU size bound
+        self.expirations = 0    # dropped by TTL
+        self.invalidations = 0  # dropped because the catalog version moved
+
+    @staticmethod
+    def make_key(query: str, filters: dict | None = None, categories: list[str] | None = None, **extra) -> tuple:
+        return (
+            " ".join(query_analysis.analyze(query).terms),
+            json.dumps(filters or {}, sort_keys=True, default=str),
+            tuple(sorted(set(categories or []))),
+            tuple(sorted(extra.items())),
+        )
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, version, value = entry
+            if version != catalog.version():
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: Any, version: int):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], Any]):
+        value = self.get(key)
+        if value is None:
+            # Read the version BEFORE computing so a write that lands mid-compute
+            # makes this entry stale instead of caching pre-write results as current.
+            version = catalog.version()
+            value = compute()
+            self.put(key, value, version)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "catalog_version": catalog.version(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# defined globally so every request shares one cache
+cache = SearchCache(settings.search_cache_size, settings.search_cache_ttl_seconds)
@@ -0,0 +1,397 @@
+import math
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, defaultdict
+from sqlalchemy.orm import Session, joinedload
+from .. import models
+from . import query_analysis
+from .query_analysis import analyze_text
+
+# --- BM25F parameters ---
+# Per-field boosts (same ordering as the old 10/6/4/2/2 SQL weights)
+FIELD_WEIGHTS = {
+    "name": 5.0,
+    "brand_name": 3.0,
+    "category": 2.0,
+    "description": 1.0,
+    "specs": 1.0,
+}
+# Per-field length normalisation. Brands/categories are short and uniform, so barely normalised.
+FIELD_B = {
+    "name": 0.75,
+    "brand_name": 0.3,
+    "category": 0.3,
+    "description": 0.75,
+    "specs": 0.75,
+}
+K1 = 1.2
+# A prefix hit ("phone" -> "phones") counts a little less than an exact term
+PREFIX_MATCH_WEIGHT = 0.8
+
+# A query word expands to every indexed term it is a prefix of ("phone" -> "phones").
+# Capped so a one-letter word cannot fan out to the whole vocabulary.
+MAX_PREFIX_EXPANSION = 50
+
+# --- Fuzzy (trigram) matching for voice transcripts: "addidas", "blutooth" ---
+# Only name/brand terms are fuzzy-matchable, and only for words with no exact/prefix hit.
+FUZZY_FIELDS = ("name", "brand_name")
+FUZZY_THRESHOLD = 0.3      # trigram similarity, same default as pg_trgm
+MAX_FUZZY_TERMS = 5        # best matches kept per misspelled word
+MAX_FUZZY_CANDIDATES = 200 # terms sharing a trigram that we bother scoring
+FUZZY_MATCH_WEIGHT = 0.6   # scaled again by the similarity itself
+
+# A hit through a synonym ("tv" -> "television") counts a little less than the word said
+SYNONYM_MATCH_WEIGHT = 0.9
+
+# --- Facets ---
+# Lower bounds of the price histogram buckets (last bucket is open ended)
+PRICE_BUCKETS = [0, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+
+def trigrams(term: str) -> set[str]:
+    """pg_trgm style: two leading blanks, one trailing."""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def product_fields(product: models.Product) -> dict[str, list[str]]:
+    """
+    Splits a Product (with categories loaded) into the token lists we index per field.
+    """
+    specs = product.specs or {}
+    spec_text = " ".join(f"{key} {value}" for key, value in specs.items())
+    category_text = " ".join(pc.category.name for pc in product.categories if pc.category)
+
+    return {
+        "name": analyze_text(product.name),
+        "brand_name": analyze_text(product.brand_name),
+        "category": analyze_text(category_text),
+        "description": analyze_text(product.description),
+        "specs": analyze_text(spec_text),
+    }
+
+
+def price_bucket(price) -> int:
+    return max(bisect_right(PRICE_BUCKETS, float(price or 0)) - 1, 0)
+
+
+def rating_bucket(rating) -> int:
+    """Whole stars: 4 means 4.0 - 4.9."""
+    return min(int(float(rating or 0)), 5)
+
+
+def rank_key(item: tuple[int, float, int]) -> tuple:
+    """Sort key for (product_id, score, num_sold): best score, then best seller, then id."""
+    product_id, score, num_sold = item
+    return (-score, -num_sold, product_id)
+
+
+class IndexedProduct:
+    """Per-product postings bookkeeping plus the precomputed facet values."""
+    __slots__ = ("terms", "field_lengths", "categories", "num_sold", "brand", "price_bucket", "rating_bucket")
+
+    def __init__(self, terms: set[str], field_lengths: dict[str, int], product: models.Product):
+        self.terms = terms
+        self.field_lengths = field_lengths
+        self.categories = {pc.category.name for pc in product.categories if pc.category}
+        self.num_sold = product.num_sold or 0
+        self.brand = product.brand_name
+        self.price_bucket = price_bucket(product.price)
+        self.rating_bucket = rating_bucket(product.avg_rating)
+
+
+class SearchIndex:
+    """
+    Token-level inverted index over the product catalog.
+
+    Maps every term to the products it appears in, with per-field term frequencies,
+    so candidate resolution and BM25F ranking for POST /search/products never touch
+    Postgres. The router only goes to the database to apply filters on the candidate
+    ids and to hydrate the top-N rows.
+
+    The index is built lazily from the DB on first use and kept up to date by the
+    product router (create/update/delete).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._postings: dict[str, dict[int, dict[str, int]]] = defaultdict(dict)
+        self._docs: dict[int, IndexedProduct] = {}
+        self._vocab: list[str] = []  # sorted, for prefix expansion
+        self._field_length_totals: Counter = Counter()
+        self._fuzzy_df: Counter = Counter()  # name/brand term -> number of products using it
+        self._trigrams: dict[str, set[str]] = defaultdict(set)
+
+    # --- Build / Maintenance ---
+    def ensure_built(self, db: Session):
+        query_analysis.synonyms.ensure_loaded(db)
+        if self._built:
+            return
+        with self._lock:
+            if not self._built:
+                self.rebuild(db)
+
+    def rebuild(self, db: Session):
+        products = db.query(models.Product)\
+            .options(joinedload(models.Product.categories).joinedload(models.ProductCategory.category))\
+            .all()
+
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._docs = {}
+            self._vocab = []
+            self._field_length_totals = Counter()
+            self._fuzzy_df = Counter()
+            self._trigrams = defaultdict(set)
+            for product in products:
+                self._add(product)
+            self._built = True
+
+    def add_product(self, product: models.Product):
+        """
+        (Re)indexes a single product. Expects product.categories to be loaded.
+        No-op until the index has been built, since the first build reads fresh rows anyway.
+        """
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(product.id)
+            self._add(product)
+
+    def remove_product(self, product_id: int):
+        with self._lock:
+            if self._built:
+                self._remove(product_id)
+
+    def update_prices(self, prices: dict[int, object]):
+        """Refreshes the price facet of already indexed products (price is not a search term)."""
+        with self._lock:
+            for product_id, price in prices.items():
+                doc = self._docs.get(product_id)
+                if doc is not None:
+                    doc.price_bucket = price_bucket(price)
+
+    def _add(self, product: models.Product):
+        terms = set()
+        fuzzy_terms = set()
+        field_lengths = {}
+        for field, tokens in product_fields(product).items():
+            field_lengths[field] = len(tokens)
+            self._field_length_totals[field] += len(tokens)
+            for token, tf in Counter(tokens).items():
+                postings = self._postings[token]
+                if not postings:
+                    insort(self._vocab, token)
+                postings.setdefault(product.id, {})[field] = tf
+                terms.add(token)
+                if field in FUZZY_FIELDS:
+                    fuzzy_terms.add(token)
+
+        for token in fuzzy_terms:
+            if self._fuzzy_df[token] == 0:
+                for gram in trigrams(token):
+                    self._trigrams[gram].add(token)
+            self._fuzzy_df[token] += 1
+
+        self._docs[product.id] = IndexedProduct(terms, field_lengths, product)
+
+    def _remove(self, product_id: int):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        self._field_length_totals.subtract(doc.field_lengths)
+        for term in doc.terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            fields = postings.pop(product_id, {})
+            if any(f in fields for f in FUZZY_FIELDS):
+                self._fuzzy_df[term] -= 1
+                if self._fuzzy_df[term] <= 0:
+                    del self._fuzzy_df[term]
+                    for gram in trigrams(term):
+                        self._trigrams[gram].discard(term)
+                        if not self._trigrams[gram]:
+                            del self._trigrams[gram]
+            if not postings:
+                del self._postings[term]
+                i = bisect_left(self._vocab, term)
+                if i < len(self._vocab) and self._vocab[i] == term:
+                    self._vocab.pop(i)
+
+    # --- Query ---
+    def _expand(self, word: str) -> list[str]:
+        """Exact term first, then indexed terms that start with it."""
+        if query_analysis.is_exact_only(word):
+            # "1" must not match "128", nor "l" every term starting with l
+            return [word] if word in self._postings else []
+        terms = []
+        i = bisect_left(self._vocab, word)
+        while i < len(self._vocab) and len(terms) < MAX_PREFIX_EXPANSION:
+            term = self._vocab[i]
+            if not term.startswith(word):
+                break
+            terms.append(term)
+            i += 1
+        return terms
+
+    def _fuzzy_expand(self, word: str) -> list[tuple[str, float]]:
+        """(term, similarity) for the closest name/brand terms, best first."""
+        word_grams = trigrams(word)
+        shared = Counter()
+        for gram in word_grams:
+            for term in self._trigrams.get(gram, ()):
+                shared[term] += 1
+
+        matches = []
+        for term, common in shared.most_common(MAX_FUZZY_CANDIDATES):
+            similarity = common / (len(word_grams) + len(trigrams(term)) - common)
+            if similarity >= FUZZY_THRESHOLD:
+                matches.append((term, similarity))
+
+        matches.sort(key=lambda m: -m[1])
+        return matches[:MAX_FUZZY_TERMS]
+
+    def _word_terms(self, word: str) -> list[tuple[str, float]]:
+        expanded = self._expand(word)
+        if expanded:
+            return [(t, 1.0 if t == word else PREFIX_MATCH_WEIGHT) for t in expanded]
+        if query_analysis.is_exact_only(word):
+            return []
+        return [(t, FUZZY_MATCH_WEIGHT * sim) for t, sim in self._fuzzy_expand(word)]
+
+    def _word_group(self, word: str, synonyms: tuple[str, ...]) -> list[tuple[str, float]]:
+        best = dict(self._word_terms(word))
+        for synonym in synonyms:
+            for term, weight in self._word_terms(synonym):
+                best[term] = max(best.get(term, 0.0), weight * SYNONYM_MATCH_WEIGHT)
+        return list(best.items())
+
+    def _query_terms(self, words: list[str], memo: dict | None = None,
+                     synonyms: tuple[tuple[str, ...], ...] | None = None) -> list[list[tuple[str, float]]]:
+        """
+        For each query word, the (term, weight) pairs it matches: exact/prefix hits,
+        or fuzzy trigram hits when there are none, plus the same for its synonyms.
+        Adjacent words that only make sense joined ("i phone", "head phones") are
+        added as an extra word.
+        `memo` (word -> pairs) lets a batch of queries expand each distinct word once.
+        """
+        synonyms = synonyms or ((),) * len(words)
+        groups = []
+        for word, word_synonyms in zip(words, synonyms):
+            if memo is None:
+                groups.append(self._word_group(word, word_synonyms))
+            else:
+                if word not in memo:
+                    memo[word] = self._word_group(word, word_synonyms)
+                groups.append(memo[word])
+
+        for left, right in zip(words, words[1:]):
+            joined = left + right
+            if joined in self._postings:
+                groups.append([(joined, 1.0)])
+
+        return groups
+
+    def _idf(self, term: str) -> float:
+        n = len(self._docs)
+        df = len(self._postings[term])
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _term_scores(self, term: str, avg_lengths: dict[str, float]) -> dict[int, float]:
+        """
+        BM25F contribution of one term: field tfs are length-normalised and boosted,
+        summed into a single pseudo-tf, then saturated once with K1.
+        """
+        idf = self._idf(term)
+        scores = {}
+        for product_id, field_tfs in self._postings[term].items():
+            lengths = self._docs[product_id].field_lengths
+            tf = 0.0
+            for field, field_tf in field_tfs.items():
+                avg = avg_lengths[field] or 1.0
+                norm = 1 - FIELD_B[field] + FIELD_B[field] * lengths[field] / avg
+                tf += FIELD_WEIGHTS[field] * field_tf / norm
+            scores[product_id] = idf * tf / (K1 + tf)
+        return scores
+
+    def search(self, query: str, categories: list[str] | None = None) -> list[tuple[int, float, int]]:
+        """
+        Returns (product_id, bm25f_score, num_sold) sorted by score desc, num_sold desc, id.
+        A query word that expands to several terms keeps its best-scoring term per product.
+        """
+        return self.search_many([query], categories)[0]
+
+    def search_many(self, queries: list[str], categories: list[str] | None = None) -> list[list[tuple[int, float, int]]]:
+        """
+        search() for several queries in one pass (shopping lists: "eggs, milk, bread").
+        Expansions and per-term posting scores are computed once and shared by every
+        query that uses the same word/term.
+        """
+        category_set = set(categories) if categories else None
+
+        with self._lock:
+            n = len(self._docs) or 1
+            avg_lengths = {f: self._field_length_totals[f] / n for f in FIELD_WEIGHTS}
+            word_terms: dict[str, list[tuple[str, float]]] = {}
+            term_scores: dict[str, dict[int, float]] = {}
+
+            results = []
+            for query in queries:
+                # Filler dropped, units/plurals normalised, synonyms attached (cached per raw query)
+                analyzed = query_analysis.analyze(query)
+                words = list(analyzed.terms)
+
+                scores: dict[int, float] = defaultdict(float)
+                for group in self._query_terms(words, word_terms, analyzed.synonyms):
+                    best: dict[int, float] = {}
+                    for term, weight in group:
+                        if term not in term_scores:
+                            term_scores[term] = self._term_scores(term, avg_lengths)
+                        for product_id, score in term_scores[term].items():
+                            score *= weight
+                            if score > best.get(product_id, 0.0):
+                                best[product_id] = score
+
+                    for product_id, score in best.items():
+                        scores[product_id] += score
+
+                if category_set:
+                    scores = {
+                        pid: score for pid, score in scores.items()
+                        if self._docs[pid].categories & category_set
+                    }
+
+                ranked = [(pid, score, self._docs[pid].num_sold) for pid, score in scores.items()]
+                ranked.sort(key=rank_key)
+                results.append(ranked)
+            return results
+
+
+    def facets(self, product_ids: list[int]) -> dict:
+        """
+        Category / brand / price / rating counts over a candidate set, in one pass
+        over the precomputed per-product facet values.
+        """
+        categories, brands, prices, ratings = Counter(), Counter(), Counter(), Counter()
+        with self._lock:
+            for product_id in product_ids:
+                doc = self._docs.get(product_id)
+                if doc is None:
+                    continue
+                categories.update(doc.categories)
+                if doc.brand:
+                    brands[doc.brand] += 1
+                prices[doc.price_bucket] += 1
+                ratings[doc.rating_bucket] += 1
+
+        return {
+            "categories": categories,
+            "brands": brands,
+            "price": prices,
+            "rating": ratings,
+        }
+
+# defined globally so every request shares one index
+index = SearchIndex()
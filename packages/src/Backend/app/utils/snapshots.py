@@ -0,0 +1,27 @@
+from fastapi import Response
+from . import fast_json
+
+# Pre-rendered product JSON for the hot list/search endpoints.
+# A snapshot is one product's ProductOutLite rendered to bytes once (utils.product_cache
+# keeps them next to the payloads and drops them on the same writes); responses are
+# built by joining snapshots, so no ORM row is hydrated and no Pydantic model is
+# validated per product on the way out.
+
+
+def render(payload) -> bytes:
+    return fast_json.dumps(payload)
+
+
+def extend(snapshot: bytes, **fields) -> bytes:
+    """Adds top-level fields to a rendered object: {"id":1,...} -> {"id":1,...,"relevance_score":2.5}."""
+    if not fields:
+        return snapshot
+    return snapshot[:-1] + b"," + render(fields)[1:]
+
+
+def array(parts: list[bytes]) -> bytes:
+    return b"[" + b",".join(parts) + b"]"
+
+
+def response(body: bytes, sub_response: Response | None = None, status_code: int = 200) -> Response:
+    return fast_json.raw(body, sub_response, status_code)
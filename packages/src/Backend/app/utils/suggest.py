@@ -0,0 +1,196 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from sqlalchemy.orm import Session, joinedload
+from .. import models
+from .query_analysis import tokenize
+
+MAX_SUGGESTIONS = 20
+# Prefixes up to this length match a large share of the catalog, so their results are
+# kept pre-ranked instead of being collected from the key range on every keystroke.
+HEAD_PREFIX_LEN = 2
+
+
+class Suggestion:
+    __slots__ = ("text", "norm", "kind", "weight", "refs")
+
+    def __init__(self, text: str, norm: str, kind: str):
+        self.text = text      # display form, as first seen
+        self.norm = norm      # lowercased tokens joined by single spaces
+        self.kind = kind
+        self.weight = 0       # sum of num_sold over contributing products
+        self.refs = 0         # contributing products; dropped at 0
+
+
+def _keys_for(norm: str) -> list[str]:
+    """One key per word start: "galaxy s24 ultra" -> itself, "s24 ultra", "ultra"."""
+    words = norm.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def _rank(entry: Suggestion, prefix: str) -> tuple:
+    # Whole-phrase prefix matches ("sam" -> "samsung ...") ahead of inner-word ones, then best sellers
+    return (not entry.norm.startswith(prefix), -entry.weight, entry.norm, entry.kind)
+
+
+class SuggestIndex:
+    """
+    Type-ahead over product names, brands and category names, weighted by num_sold.
+
+    Every suggestion is keyed once per word it contains ("galaxy s24 ultra" is found
+    by "gal", "s2" and "ult") and the keys live in one sorted list, so a prefix is a
+    bisect to each end of the contiguous match range. One and two character prefixes,
+    whose ranges are wide, are answered from lists kept in rank order instead.
+
+    Built lazily from the DB and kept up to date by the product router.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._entries: dict[tuple[str, str], Suggestion] = {}
+        self._keys: list[tuple[str, str, str]] = []  # sorted (key, kind, norm)
+        self._heads: dict[str, list[tuple]] = {}      # short prefix -> sorted _rank() tuples
+        self._contributions: dict[int, list[tuple[str, str, int]]] = {}  # product id -> (kind, norm, weight)
+
+    # --- Build / Maintenance ---
+    def ensure_built(self, db: Session):
+        if self._built:
+            return
+        with self._lock:
+            if not self._built:
+                self.rebuild(db)
+
+    def rebuild(self, db: Session):
+        products = db.query(models.Product)\
+            .options(joinedload(models.Product.categories).joinedload(models.ProductCategory.category))\
+            .all()
+
+        # Weights are summed first and each list sorted once: an insort per product (and a
+        # re-rank of the entry's head rows every time a brand recurs) is quadratic in the catalog
+        entries, contributions = {}, {}
+        for product in products:
+            contributions[product.id] = []
+            for kind, norm, text, weight in self._phrases(product):
+                entry = entries.get((kind, norm))
+                if entry is None:
+                    entry = entries[(kind, norm)] = Suggestion(text, norm, kind)
+                entry.weight += weight
+                entry.refs += 1
+                contributions[product.id].append((kind, norm, weight))
+
+        keys = sorted((key, kind, norm) for kind, norm in entries for key in _keys_for(norm))
+        heads = defaultdict(list)
+        for entry in entries.values():
+            for prefix in self._head_prefixes(entry.norm):
+                heads[prefix].append(_rank(entry, prefix))
+        for head in heads.values():
+            head.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self._heads = dict(heads)
+            self._contributions = contributions
+            self._built = True
+
+    def add_product(self, product: models.Product):
+        """(Re)indexes one product. Expects categories loaded. No-op until built."""
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(product.id)
+            self._add(product)
+
+    def remove_product(self, product_id: int):
+        with self._lock:
+            if self._built:
+                self._remove(product_id)
+
+    @staticmethod
+    def _head_prefixes(norm: str) -> set[str]:
+        return {key[:n] for key in _keys_for(norm) for n in range(1, min(HEAD_PREFIX_LEN, len(key)) + 1)}
+
+    def _unhead(self, entry: Suggestion):
+        for prefix in self._head_prefixes(entry.norm):
+            head = self._heads[prefix]
+            rank = _rank(entry, prefix)
+            i = bisect_left(head, rank)
+            if i < len(head) and head[i] == rank:
+                head.pop(i)
+            if not head:
+                del self._heads[prefix]
+
+    def _head(self, entry: Suggestion):
+        for prefix in self._head_prefixes(entry.norm):
+            insort(self._heads.setdefault(prefix, []), _rank(entry, prefix))
+
+    @staticmethod
+    def _phrases(product: models.Product) -> list[tuple[str, str, str, int]]:
+        """(kind, norm, display text, weight) for each distinct phrase the product contributes."""
+        weight = product.num_sold or 0
+        phrases = [("product", product.name), ("brand", product.brand_name)]
+        phrases += [("category", pc.category.name) for pc in product.categories if pc.category]
+
+        seen, out = set(), []
+        for kind, text in phrases:
+            norm = " ".join(tokenize(text))
+            if not norm or (kind, norm) in seen:
+                continue
+            seen.add((kind, norm))
+            out.append((kind, norm, text.strip(), weight))
+        return out
+
+    def _add(self, product: models.Product):
+        """Incremental (single product) insert: keys and head rows go in with insort."""
+        contributions = []
+        for kind, norm, text, weight in self._phrases(product):
+            entry = self._entries.get((kind, norm))
+            if entry is None:
+                entry = self._entries[(kind, norm)] = Suggestion(text, norm, kind)
+                for key in _keys_for(norm):
+                    insort(self._keys, (key, kind, norm))
+            else:
+                self._unhead(entry)
+            entry.weight += weight
+            entry.refs += 1
+            self._head(entry)
+            contributions.append((kind, norm, weight))
+
+        self._contributions[product.id] = contributions
+
+    def _remove(self, product_id: int):
+        for kind, norm, weight in self._contributions.pop(product_id, []):
+            entry = self._entries[(kind, norm)]
+            self._unhead(entry)
+            entry.weight -= weight
+            entry.refs -= 1
+            if entry.refs > 0:
+                self._head(entry)
+                continue
+            del self._entries[(kind, norm)]
+            for key in _keys_for(norm):
+                i = bisect_left(self._keys, (key, kind, norm))
+                if i < len(self._keys) and self._keys[i] == (key, kind, norm):
+                    self._keys.pop(i)
+
+    # --- Query ---
+    def suggest(self, prefix: str, limit: int = 10) -> list[Suggestion]:
+        """Best `limit` suggestions with a word starting with `prefix`."""
+        norm = " ".join(tokenize(prefix))
+        if not norm:
+            return []
+
+        with self._lock:
+            if len(norm) <= HEAD_PREFIX_LEN:
+                return [self._entries[(kind, n)] for _, _, n, kind in self._heads.get(norm, [])[:limit]]
+
+            start = bisect_left(self._keys, (norm,))
+            end = bisect_left(self._keys, (norm + "\uffff",), start)
+            matches = {(kind, n) for _, kind, n in self._keys[start:end]}
+            return heapq.nsmallest(limit, (self._entries[m] for m in matches), key=lambda e: _rank(e, norm))
+
+
+# defined globally so every request shares one index
+index = SuggestIndex()
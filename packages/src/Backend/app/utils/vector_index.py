@@ -0,0 +1,210 @@
+import json
+import logging
+import math
+import os
+import threading
+from sqlalchemy.orm import Session, joinedload
+from .. import models
+from ..config import settings
+
+try:
+    import numpy as np
+    import faiss
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    logging.warning("faiss-cpu / sentence-transformers not available - semantic search disabled")
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+# Below this many products an exact flat index is as fast as IVF and needs no training
+IVF_MIN_PRODUCTS = 10_000
+IVF_NPROBE = 16
+EMBED_BATCH_SIZE = 256
+# Incremental writes are persisted every N changes (and on shutdown)
+SAVE_EVERY = 100
+
+
+def product_text(product: models.Product) -> str:
+    """What we embed: name + brand + description + categories + specs."""
+    categories = " ".join(pc.category.name for pc in product.categories if pc.category)
+    specs = " ".join(f"{key} {value}" for key, value in (product.specs or {}).items())
+    parts = [product.name, product.brand_name, product.description, categories, specs]
+    return ". ".join(p for p in parts if p)
+
+
+class VectorIndex:
+    """
+    FAISS index of product embeddings (cosine similarity via inner product on
+    normalized vectors), keyed by product id.
+
+    Small catalogs use an exact flat index; from IVF_MIN_PRODUCTS on it is an IVF index.
+    The index is persisted to disk and memory-mapped when loaded at startup, then kept
+    current by the product router (add/remove on writes).
+    """
+
+    def __init__(self, path: str, model_name: str):
+        self.path = path
+        self.ids_path = path + ".ids.json"
+        self.model_name = model_name
+        self._lock = threading.RLock()
+        self._model = None
+        self._index = None
+        self._ids: set[int] = set()
+        self._mmapped = False
+        self._dirty = 0
+
+    @property
+    def available(self) -> bool:
+        return faiss is not None
+
+    # --- Embedding ---
+    def _embed(self, texts: list[str]):
+        if self._model is None:
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+        vectors = self._model.encode(texts, batch_size=EMBED_BATCH_SIZE, normalize_embeddings=True)
+        return np.asarray(vectors, dtype="float32")
+
+    # --- Build / Load / Save ---
+    def ensure_loaded(self, db: Session):
+        if self._index is not None:
+            return
+        with self._lock:
+            if self._index is None and not self.load():
+                self.build(db)
+
+    def load(self) -> bool:
+        """Memory-maps the persisted index, if there is one. Returns False otherwise."""
+        if not os.path.exists(self.path) or not os.path.exists(self.ids_path):
+            return False
+
+        with open(self.ids_path) as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model_name:
+            logger.warning(f"Vector index at {self.path} was built with {meta.get('model')}, rebuilding")
+            return False
+
+        with self._lock:
+            try:
+                self._index = faiss.read_index(self.path, faiss.IO_FLAG_MMAP)
+                self._mmapped = True
+            except RuntimeError:
+                self._index = faiss.read_index(self.path)
+                self._mmapped = False
+            if hasattr(self._index, "nprobe"):
+                self._index.nprobe = IVF_NPROBE
+            self._ids = set(meta["ids"])
+            self._dirty = 0
+        logger.info(f"Loaded vector index: {len(self._ids)} products (mmap={self._mmapped})")
+        return True
+
+    def build(self, db: Session):
+        ids, vectors = [], []
+        last_id = 0
+        while True:
+            batch = db.query(models.Product)\
+                .options(joinedload(models.Product.categories).joinedload(models.ProductCategory.category))\
+                .filter(models.Product.id > last_id)\
+                .order_by(models.Product.id)\
+                .limit(EMBED_BATCH_SIZE)\
+                .all()
+            if not batch:
+                break
+            ids.extend(p.id for p in batch)
+            vectors.append(self._embed([product_text(p) for p in batch]))
+            last_id = batch[-1].id
+
+        dim = self._embed([""]).shape[1]
+        matrix = np.vstack(vectors) if vectors else np.zeros((0, dim), dtype="float32")
+
+        if len(ids) >= IVF_MIN_PRODUCTS:
+            nlist = int(4 * math.sqrt(len(ids)))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(matrix)
+            index.nprobe = IVF_NPROBE
+        else:
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+        if ids:
+            index.add_with_ids(matrix, np.asarray(ids, dtype="int64"))
+
+        with self._lock:
+            self._index = index
+            self._ids = set(ids)
+            self._mmapped = False
+            self.save()
+        logger.info(f"Built vector index: {len(ids)} products")
+
+    def save(self):
+        with self._lock:
+            if self._index is None:
+                return
+            # Write to temp files and swap, so a crash never leaves a half-written index
+            faiss.write_index(self._index, self.path + ".tmp")
+            with open(self.ids_path + ".tmp", "w") as f:
+                json.dump({"model": self.model_name, "ids": sorted(self._ids)}, f)
+            os.replace(self.path + ".tmp", self.path)
+            os.replace(self.ids_path + ".tmp", self.ids_path)
+            self._dirty = 0
+
+    def save_if_dirty(self):
+        if self._dirty:
+            self.save()
+
+    # --- Incremental maintenance ---
+    def _writable(self):
+        # mmapped indexes are read-only; pull it fully into memory on first write
+        if self._mmapped:
+            self._index = faiss.read_index(self.path)
+            if hasattr(self._index, "nprobe"):
+                self._index.nprobe = IVF_NPROBE
+            self._mmapped = False
+        return self._index
+
+    def _changed(self, count: int = 1):
+        self._dirty += count
+        if self._dirty >= SAVE_EVERY:
+            self.save()
+
+    def add_product(self, product: models.Product):
+        """(Re)embeds one product. No-op until the index is loaded. Expects categories loaded."""
+        self.add_products([product])
+
+    def add_products(self, products: list[models.Product]):
+        """(Re)embeds several products with one model call (bulk import)."""
+        if not self.available or self._index is None or not products:
+            return
+        vectors = self._embed([product_text(p) for p in products])
+        ids = np.asarray([p.id for p in products], dtype="int64")
+        with self._lock:
+            index = self._writable()
+            existing = [pid for pid in ids.tolist() if pid in self._ids]
+            if existing:
+                index.remove_ids(np.asarray(existing, dtype="int64"))
+            index.add_with_ids(vectors, ids)
+            self._ids.update(ids.tolist())
+            self._changed(len(ids))
+
+    def remove_product(self, product_id: int):
+        if not self.available or self._index is None:
+            return
+        with self._lock:
+            if product_id not in self._ids:
+                return
+            self._writable().remove_ids(np.asarray([product_id], dtype="int64"))
+            self._ids.discard(product_id)
+            self._changed()
+
+    # --- Query ---
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        """(product_id, cosine similarity), most similar first."""
+        vector = self._embed([query])
+        with self._lock:
+            if not self._ids:
+                return []
+            scores, ids = self._index.search(vector, min(k, len(self._ids)))
+        return [(int(pid), float(score)) for pid, score in zip(ids[0], scores[0]) if pid != -1]
+
+
+# defined globally so every request shares one index (and one loaded model)
+index = VectorIndex(settings.vector_index_path, settings.embedding_model)
@@ -0,0 +1,153 @@
+"""
+Response serialization benchmark: encodes the product list, search, cart and orders
+payloads through a FastAPI route per response mode and reports bytes/sec.
+
+Modes:
+    default  FastAPI's JSONResponse (response_model validation + FastAPI's encoder)
+    orjson   utils.fast_json.FastJSONResponse (settings.json_response = "orjson")
+    trusted  fast_json.trusted(): already-built schema instances / payload dicts,
+             encoded without re-validation
+
+Payloads are built in memory from the synthetic catalog (transient ORM rows with
+Decimal prices and timezone-aware timestamps, like a session returns), so no
+database is needed and only serialization differs between modes.
+
+Run from packages/src/Backend:
+    python -m benchmarks.json_benchmark --requests 500 --page-size 100
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import List
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import models, schemas
+from app.utils import fast_json
+from .synthetic_catalog import generate_products
+
+MODES = ("default", "orjson", "trusted")
+PAYLOADS = ("products", "search", "cart", "orders")
+
+
+def build_products(n: int) -> list[models.Product]:
+    categories, products = {}, []
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for i, fields in enumerate(generate_products(n), start=1):
+        names = fields.pop("categories")
+        for name in names:
+            if name not in categories:
+                categories[name] = models.Category(id=len(categories) + 1, name=name)
+        product = models.Product(
+            id=i,
+            created_at=created_at + timedelta(minutes=i),
+            **{**fields, "price": Decimal(str(fields["price"])), "avg_rating": Decimal(str(fields["avg_rating"]))}
+        )
+        product.categories = [models.ProductCategory(category=categories[name]) for name in names]
+        products.append(product)
+    return products
+
+
+def build_payloads(page_size: int) -> dict[str, tuple]:
+    """payload name -> (response_model, content for default/orjson, content for trusted)"""
+    products = build_products(page_size)
+
+    lite = [schemas.ProductOutLite.model_validate(p) for p in products]
+    search = [
+        {**product.model_dump(mode="json"), "relevance_score": round(10.0 / rank, 4)}
+        for rank, product in enumerate(lite, start=1)
+    ]
+
+    cart_size = max(page_size // 5, 1)
+    cart = [models.Cart(user_id=1, product_id=p.id, quantity=2, product=p) for p in products[:cart_size]]
+
+    orders = []
+    for i in range(cart_size):
+        items = [
+            models.OrderItem(product_id=p.id, quantity=1 + j, price=p.price, product=p)
+            for j, p in enumerate(products[i * 3 % page_size:i * 3 % page_size + 3])
+        ]
+        orders.append(models.Orders(
+            id=i + 1, user_id=1, address="221B Baker Street, London", status="delivered",
+            total_amount=sum(item.price * item.quantity for item in items),
+            created_at=datetime(2025, 6, 1, tzinfo=timezone.utc) + timedelta(hours=i), items=items
+        ))
+
+    return {
+        "products": (List[schemas.ProductOutLite], products, lite),
+        "search": (List[schemas.ProductSearchOut], search, search),
+        "cart": (List[schemas.CartOut], cart, [schemas.CartOut.model_validate(c) for c in cart]),
+        "orders": (List[schemas.OrderOut], orders, [schemas.OrderOut.model_validate(o) for o in orders]),
+    }
+
+
+def _endpoint(content, trusted: bool = False):
+    # A closure, not a default argument: FastAPI would treat that as a query parameter
+    if trusted:
+        return lambda: fast_json.trusted(content)
+    return lambda: content
+
+
+def build_app(payloads: dict[str, tuple]) -> FastAPI:
+    app = FastAPI()
+    for name, (response_model, content, trusted_content) in payloads.items():
+        app.get(f"/default/{name}", response_model=response_model)(_endpoint(content))
+        app.get(f"/orjson/{name}", response_model=response_model, response_class=fast_json.FastJSONResponse)(
+            _endpoint(content)
+        )
+        app.get(f"/trusted/{name}", response_model=response_model)(_endpoint(trusted_content, trusted=True))
+    return app
+
+
+def run(client: TestClient, mode: str, payload: str, requests: int) -> dict:
+    path = f"/{mode}/{payload}"
+    body = client.get(path).content  # warmup (and the size every request returns)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        response.raise_for_status()
+    wall = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "payload": payload,
+        "response_bytes": len(body),
+        "requests_per_second": requests / wall if wall else 0.0,
+        "bytes_per_second": len(body) * requests / wall if wall else 0.0,
+        "mean_ms": wall / requests * 1000,
+    }
+
+
+def print_report(results: list[dict], page_size: int):
+    print(f"\nPage size: {page_size} products ({max(page_size // 5, 1)} cart lines / orders), encoder: "
+          f"{'orjson' if fast_json.orjson is not None else 'stdlib'}")
+    print(f"{'payload':<10} {'mode':<9} {'bytes':>9} {'req/s':>9} {'MB/s':>9} {'mean ms':>9} {'vs default':>11}")
+    baseline = {r["payload"]: r["bytes_per_second"] for r in results if r["mode"] == "default"}
+    for r in results:
+        speedup = r["bytes_per_second"] / baseline[r["payload"]] if baseline.get(r["payload"]) else 0.0
+        print(f"{r['payload']:<10} {r['mode']:<9} {r['response_bytes']:>9} {r['requests_per_second']:>9.1f} "
+              f"{r['bytes_per_second'] / 1e6:>9.2f} {r['mean_ms']:>9.2f} {speedup:>10.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--payloads", nargs="+", choices=PAYLOADS, default=list(PAYLOADS))
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    payloads = build_payloads(args.page_size)
+    with TestClient(build_app(payloads)) as client:
+        results = [
+            run(client, mode, payload, args.requests)
+            for payload in args.payloads
+            for mode in ("default", *[m for m in args.modes if m != "default"])
+        ]
+
+    print_report(results, args.page_size)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"page_size": args.page_size, "requests": args.requests, "results": results}, f, indent=2)
@@ -0,0 +1,32 @@
+-- Full-text search support for products (search_backend = "fulltext").
+-- Fresh databases get this from models.Base.metadata.create_all; run this once on existing ones:
+--   psql "$database_url" -f migrations/001_product_search_vector.sql
+
+BEGIN;
+
+-- 1. Denormalized category names, so the generated column can see them
+ALTER TABLE products ADD COLUMN IF NOT EXISTS category_names VARCHAR;
+
+UPDATE products p
+SET category_names = sub.names
+FROM (
+    SELECT pc.product_id, string_agg(c.name, ' ') AS names
+    FROM product_categories pc
+    JOIN categories c ON c.id = pc.category_id
+    GROUP BY pc.product_id
+) sub
+WHERE sub.product_id = p.id;
+
+-- 2. Weighted search document: name A, brand B, categories C, description/specs D
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(brand_name, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(category_names, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(description, '') || ' ' || coalesce(specs::text, '')), 'D')
+    ) STORED;
+
+-- 3. GIN index for @@ lookups
+CREATE INDEX IF NOT EXISTS idx_product_search_vector ON products USING gin (search_vector);
+
+COMMIT;
@@ -0,0 +1,31 @@
+-- Image metadata for GET /product/{id}/images/{image_id} (ETag, Content-Type, Content-Length),
+-- so serving or describing an image never has to read the blob itself.
+-- Fresh databases get the columns from models.Base.metadata.create_all; run this once on existing ones:
+--   psql "$database_url" -f migrations/002_product_image_metadata.sql
+
+BEGIN;
+
+ALTER TABLE product_images ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+ALTER TABLE product_images ADD COLUMN IF NOT EXISTS content_type VARCHAR;
+ALTER TABLE product_images ADD COLUMN IF NOT EXISTS size INTEGER;
+
+UPDATE product_images
+SET content_hash = encode(sha256(image_data), 'hex'),
+    size = octet_length(image_data),
+    content_type = CASE
+        WHEN substring(image_data FROM 1 FOR 3) = '\xffd8ff'::bytea THEN 'image/jpeg'
+        WHEN substring(image_data FROM 1 FOR 8) = '\x89504e470d0a1a0a'::bytea THEN 'image/png'
+        WHEN substring(image_data FROM 1 FOR 4) = 'GIF8'::bytea THEN 'image/gif'
+        WHEN substring(image_data FROM 1 FOR 4) = 'RIFF'::bytea
+         AND substring(image_data FROM 9 FOR 4) = 'WEBP'::bytea THEN 'image/webp'
+        ELSE 'application/octet-stream'
+    END
+WHERE content_hash IS NULL;
+
+-- Images are already compressed: store them uncompressed out of line (EXTERNAL) so the
+-- endpoint's substring() slices read only the TOAST chunks they need. Applies to new writes.
+ALTER TABLE product_images ALTER COLUMN image_data SET STORAGE EXTERNAL;
+
+CREATE INDEX IF NOT EXISTS ix_product_images_product_id ON product_images (product_id);
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- Pluggable image storage (app/utils/blob_store.py): each image row records where its bytes
+-- live, and image_data is NULL for rows kept in the filesystem store.
+-- Fresh databases get the columns from models.Base.metadata.create_all; run this once on existing ones:
+--   psql "$database_url" -f migrations/003_image_blob_store.sql
+-- then move the bytes out with: python -m app.commands.migrate_image_store --to filesystem
+
+BEGIN;
+
+ALTER TABLE product_images ADD COLUMN IF NOT EXISTS storage VARCHAR NOT NULL DEFAULT 'database';
+ALTER TABLE product_images ALTER COLUMN image_data DROP NOT NULL;
+
+ALTER TABLE IF EXISTS product_image_variants ADD COLUMN IF NOT EXISTS storage VARCHAR NOT NULL DEFAULT 'database';
+ALTER TABLE IF EXISTS product_image_variants ALTER COLUMN image_data DROP NOT NULL;
+
+COMMIT;
@@ -0,0 +1,27 @@
+-- Popularity / trending scores (app/utils/popularity.py), maintained in batches from order events.
+-- Fresh databases get the tables from models.Base.metadata.create_all; run this once on existing ones:
+--   psql "$database_url" -f migrations/004_popularity.sql
+-- then fill them from the order history with: python -m app.commands.rebuild_popularity
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS product_popularity (
+    product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    trending_score DOUBLE PRECISION,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_product_popularity_trending ON product_popularity (trending_score DESC, product_id);
+CREATE INDEX IF NOT EXISTS idx_product_popularity_updated ON product_popularity (updated_at);
+
+CREATE TABLE IF NOT EXISTS category_popularity (
+    category_id INTEGER PRIMARY KEY REFERENCES categories(id) ON DELETE CASCADE,
+    num_sold INTEGER NOT NULL DEFAULT 0,
+    trending_score DOUBLE PRECISION,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_category_popularity_trending ON category_popularity (trending_score DESC, category_id);
+
+-- All-time best sellers (GET /product/trending?sort=num_sold)
+CREATE INDEX IF NOT EXISTS idx_product_num_sold ON products (num_sold, id);
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- Indexes for GET /categories/{id}/products: a page walks one (sort column, id) index on
+-- products and checks each id against product_categories (category_id, product_id).
+-- Fresh databases get these from models.Base.metadata.create_all; run this once on existing ones:
+--   psql "$database_url" -f migrations/005_category_listing_indexes.sql
+-- No BEGIN/COMMIT: CREATE INDEX CONCURRENTLY doesn't block writes but can't run in a transaction.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_product_categories_category ON product_categories (category_id, product_id);
+
+-- Replaces the price-only index (still serves the price filters)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_product_price_id ON products (price, id);
+DROP INDEX CONCURRENTLY IF EXISTS idx_product_price;
+ALTER INDEX idx_product_price_id RENAME TO idx_product_price;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_product_avg_rating ON products (avg_rating, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_product_created_at ON products (created_at, id);
+-- idx_product_num_sold (num_sold, id) comes with 004_popularity.sql
+
+ANALYZE products;
+ANALYZE product_categories;
@@ -0,0 +1,31 @@
+-- Category closure table (models.CategoryClosure, app/utils/category_tree.py): every
+-- (ancestor, descendant) pair of the category tree, so subtrees and ancestors are one
+-- indexed read instead of a walk down parent_id.
+-- Fresh databases get the table from models.Base.metadata.create_all; run this once on existing ones:
+--   psql "$database_url" -f migrations/006_category_closure.sql
+-- Re-running it rebuilds the rows from categories.parent_id (e.g. after categories were
+-- edited or deleted by hand).
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS category_closure (
+    ancestor_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    descendant_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+CREATE INDEX IF NOT EXISTS idx_category_closure_descendant ON category_closure (descendant_id, ancestor_id);
+
+DELETE FROM category_closure;
+INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+WITH RECURSIVE paths (ancestor_id, descendant_id, depth) AS (
+    SELECT id, id, 0 FROM categories
+    UNION ALL
+    SELECT paths.ancestor_id, categories.id, paths.depth + 1
+    FROM paths JOIN categories ON categories.parent_id = paths.descendant_id
+)
+SELECT ancestor_id, descendant_id, depth FROM paths;
+
+COMMIT;
+
+ANALYZE category_closure;
@@ -0,0 +1,31 @@
+import json
+from app import models
+
+
+def _import(client, records: list[dict]) -> dict:
+    body = "\n".join(json.dumps(record) for record in records).encode()
+    response = client.post("/product/import?format=ndjson", files={"file": ("products.ndjson", body)})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_records_with_and_without_ids_in_one_file(client, db):
+    records = [
+        {"id": 1, "name": "Amul Milk 1 litre", "price": 1, "stock": 10},
+        {"id": 2, "name": "Brown Eggs 12", "price": 3, "stock": 4},
+        # No id: these must not be handed 1 and 2 by the serial
+        {"name": "Whole Wheat Bread", "price": 2, "stock": 7},
+        {"name": "Salted Butter 500g", "price": 5, "stock": 3},
+    ]
+
+    report = _import(client, records)
+
+    assert (report["created"], report["updated"], report["rejected"]) == (4, 0, 0)
+    names = dict(db.query(models.Product.id, models.Product.name).all())
+    assert names[1] == "Amul Milk 1 litre" and names[2] == "Brown Eggs 12"
+    assert sorted(names.values()) == sorted(record["name"] for record in records)
+
+    # The serial is past every imported id for the next import as well
+    report = _import(client, [{"name": "Greek Yoghurt", "price": 2, "stock": 5}])
+    assert report["created"] == 1
+    assert db.query(models.Product).count() == 5
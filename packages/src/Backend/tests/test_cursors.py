@@ -0,0 +1,45 @@
+import pytest
+from app import models
+from app.config import settings
+from app.utils import pagination
+
+
+@pytest.fixture
+def products(db):
+    db.add_all([models.Product(name=f"Oat Milk {i}", description="Plain oat milk", price=2, stock=5) for i in range(3)])
+    db.commit()
+
+
+@pytest.mark.parametrize("backend", ["index", "fulltext"])
+@pytest.mark.parametrize("values", [
+    ("x", 0, 1, None),
+    (1.0, "many", 1, None),
+    (1.0, 0, "1 OR 1=1", None),
+    (1.0, 0, None, None),
+    (1.0, 0, [1], None),
+    (1.0, 0, 1, "later"),
+])
+def test_search_rejects_cursors_with_wrong_types(client, products, monkeypatch, backend, values):
+    monkeypatch.setattr(settings, "search_backend", backend)
+    body = {"query": "milk", "limit": 1, "cursor": pagination.encode_cursor(*values)}
+
+    response = client.post("/search/products", json=body)
+
+    assert response.status_code == 400, response.text
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+@pytest.mark.parametrize("last_id", ["1 OR 1=1", None, {"id": 1}])
+def test_product_list_rejects_cursors_with_wrong_types(client, products, last_id):
+    response = client.get("/product/", params={"cursor": pagination.encode_cursor(last_id)})
+
+    assert response.status_code == 400, response.text
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+def test_product_list_follows_its_own_cursor(client, products):
+    first = client.get("/product/", params={"limit": 2})
+    second = client.get("/product/", params={"limit": 2, "cursor": first.headers["x-next-cursor"]})
+
+    assert second.status_code == 200, second.text
+    assert [p["id"] for p in first.json() + second.json()] == [1, 2, 3]
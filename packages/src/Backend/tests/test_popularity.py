@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from app import models
+from app.utils import popularity
+
+
+def _product(db) -> tuple[int, int]:
+    """A product in one category; returns (product_id, category_id)."""
+    category = models.Category(name="Groceries")
+    product = models.Product(name="Amul Milk 1 litre", description="Toned milk", price=1, stock=100)
+    db.add_all([category, product])
+    db.flush()
+    db.add(models.ProductCategory(product_id=product.id, category_id=category.id))
+    db.commit()
+    return product.id, category.id
+
+
+def _order(db, user_id: int, product_id: int, quantity: int, created_at: datetime | None = None) -> int:
+    order = models.Orders(user_id=user_id, address="Home", total_amount=quantity, status="Pending",
+                          **({"created_at": created_at} if created_at else {}))
+    db.add(order)
+    db.flush()
+    db.add(models.OrderItem(order_id=order.id, product_id=product_id, quantity=quantity, price=1))
+    db.commit()
+    return order.id
+
+
+def _scores(db, product_id: int, category_id: int) -> tuple:
+    db.expire_all()
+    product = db.get(models.ProductPopularity, product_id)
+    category = db.get(models.CategoryPopularity, category_id)
+    return product.trending_score, category.trending_score, category.num_sold
+
+
+def _cancel(client, order_id: int):
+    response = client.patch(f"/orders/{order_id}", json={"status": "Cancelled"})
+    assert response.status_code == 200, response.text
+    popularity.sales.flush()
+
+
+def test_cancelling_an_order_placed_before_tracking_keeps_the_score(client, db, user):
+    product_id, category_id = _product(db)
+    # Placed (and never counted) before the popularity tables existed, bigger than what sold since
+    old_order = _order(db, user.id, product_id, 50, created_at=datetime.now(timezone.utc) - timedelta(days=2))
+    popularity.sales.record([(product_id, 1)])
+    popularity.sales.flush()
+    before = _scores(db, product_id, category_id)
+
+    _cancel(client, old_order)
+
+    after = _scores(db, product_id, category_id)
+    assert after[0] is not None and after[1] is not None
+    assert after == pytest.approx(before)
+    assert after[2] == 1
+
+
+def test_cancelling_a_tracked_order_takes_back_its_sale(client, db, user):
+    product_id, category_id = _product(db)
+    order_id = _order(db, user.id, product_id, 3)
+    popularity.sales.record([(product_id, 3)], at=db.get(models.Orders, order_id).created_at)
+    popularity.sales.flush()
+
+    _cancel(client, order_id)
+
+    assert _scores(db, product_id, category_id) == (None, None, 0)
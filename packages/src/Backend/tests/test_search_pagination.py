@@ -0,0 +1,77 @@
+import math
+import pytest
+from app import models
+from app.config import settings
+from app.utils import popularity, search_cache
+
+
+def _add_products(db) -> set[int]:
+    """Products matching "milk" (with many exact ties on rank and num_sold) plus a few that don't; returns the matches."""
+    matching = [
+        # Identical text and sales: only the id tells these apart
+        *[models.Product(name="Oat Milk 1 litre", description="Plain oat milk", price=2, stock=5) for _ in range(20)],
+        *[models.Product(name=f"Milk Chocolate {i}", description="Dark and milk chocolate bar", price=3, stock=5,
+                         num_sold=i % 3) for i in range(15)],
+        models.Product(name="Milk Frother", description="Whisks milk for milk coffee", price=20, stock=5),
+    ]
+    other = [models.Product(name=f"Coffee Beans {i}", description="Arabica", price=9, stock=5) for i in range(5)]
+    db.add_all(matching + other)
+    db.commit()
+    return {product.id for product in matching}
+
+
+def _page_all(client, query: str, limit: int, between_pages=None) -> list[int]:
+    """Follows X-Next-Cursor until it runs out; returns the ids in the order they were served."""
+    ids, cursor = [], None
+    for _ in range(100):
+        if cursor and between_pages:
+            between_pages()
+        body = {"query": query, "limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.post("/search/products", json=body)
+        assert response.status_code == 200, response.text
+        ids += [product["id"] for product in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return ids
+    pytest.fail("cursor never ran out")
+
+
+@pytest.mark.parametrize("trending_weight", [0.0, 0.2])
+def test_fulltext_pages_return_every_match_once(client, db, monkeypatch, trending_weight):
+    monkeypatch.setattr(settings, "search_backend", "fulltext")
+    monkeypatch.setattr(settings, "search_trending_weight", trending_weight)
+    expected = _add_products(db)
+
+    served = _page_all(client, "milk", limit=7)
+
+    assert len(served) == len(set(served))
+    assert set(served) == expected
+
+
+@pytest.mark.parametrize("backend", ["index", "fulltext"])
+def test_trending_boost_pages_stay_consistent_as_time_passes(client, db, monkeypatch, backend):
+    monkeypatch.setattr(settings, "search_backend", backend)
+    monkeypatch.setattr(settings, "search_trending_weight", 0.2)
+    expected = _add_products(db)
+    # Every other match sold recently, in different amounts
+    now = popularity.offset()
+    db.add_all([
+        models.ProductPopularity(product_id=pid, trending_score=now + math.log(1 + i * 7))
+        for i, pid in enumerate(sorted(expected)[::2])
+    ])
+    db.commit()
+
+    # Each page is fetched one decay time constant later than the last, after the cached
+    # ranking expired: the boosted scores are all different by then
+    clock = {"shift": 0.0}
+    real_offset = popularity.offset
+    monkeypatch.setattr(popularity, "offset", lambda at=None: real_offset(at) + clock["shift"])
+
+    def later():
+        clock["shift"] += 1.0
+        search_cache.cache.clear()
+
+    served = _page_all(client, "milk", limit=5, between_pages=later)
+
+    assert len(served) == len(set(served))
+    assert set(served) == expected
@@ -26,6 +26,7 @@ from pydantic import BaseModel, Field
 from tools import (
     add_to_cart,
     search_products,
+    search_products_batch,
     remove_from_cart,
     get_user_cart,
     checkout_cart,
@@ -149,6 +150,7 @@ def shopping_list_agent_node(state: AgentState) -> AgentState:
 
 Available tools:
 - search_products(query: str) -> Returns JSON list of products
+- search_products_batch(queries: list[str]) -> Returns JSON {query: [products]}; use it for lists of several items
 - add_to_cart(user_id: int, product_id: int, quantity: int) -> Adds to cart
 
 Be friendly and helpful. Show product details clearly."""
@@ -156,7 +158,7 @@ Be friendly and helpful. Show product details clearly."""
     agent = create_agent(
         llm,
         system_prompt=system_prompt,
-        tools=[search_products, add_to_cart]
+        tools=[search_products, search_products_batch, add_to_cart]
     )
     
     try:
@@ -179,6 +181,13 @@ Be friendly and helpful. Show product details clearly."""
                         products = json.loads(content)
                     except:
                         pass
+                elif isinstance(content, str) and content.strip().startswith('{'):
+                    # search_products_batch: {query: [products]}
+                    try:
+                        batch = json.loads(content)
+                        products = [p for items in batch.values() if isinstance(items, list) for p in items]
+                    except:
+                        pass
         
         state["response"] = response or "I found some products for you!"
         state["current_agent"] = "shopping_list_agent"
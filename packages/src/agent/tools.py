@@ -4,6 +4,7 @@ import sys
 import os
 import json
 import logging
+import httpx
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -19,45 +20,67 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Searches go through the Backend API (port 8000) rather than an index built in this
+# process: the Backend's copy is the one catalog writes keep up to date
+BACKEND_URL = os.getenv("BACKEND_SERVICE_URL", "http://localhost:8000")
+
+# defined globally so every tool call shares one connection pool
+backend = httpx.Client(base_url=BACKEND_URL, timeout=10.0)
+
 
 @tool
 def search_products(query: str) -> str:
     """Search for products by name or description"""
-    if database is None:
-        # Mock data
-        return json.dumps([
-            {"id": 1, "name": "Gaming Laptop", "price": 1299.99, "stock": 50},
-            {"id": 2, "name": "Wireless Mouse", "price": 79.99, "stock": 200}
-        ])
-    
-    db = database.SessionLocal()
     try:
-        from sqlalchemy import or_
-        results = db.query(Product).filter(
-            or_(
-                Product.name.ilike(f"%{query}%"),
-                Product.description.ilike(f"%{query}%")
-            )
-        ).limit(10).all()
-        
-        if not results:
+        # Typo-tolerant ranked search (voice transcripts: "addidas", "i phone") from the
+        # Backend, which also caches it and drops the cache when the catalog changes
+        response = backend.post("/search/products", json={"query": query, "limit": 10})
+        if response.status_code == 404:
             return f"No products found for '{query}'."
+        response.raise_for_status()
         
         products = [
             {
-                "id": p.id,
-                "name": p.name,
-                "price": float(p.price),
-                "stock": p.stock
+                "id": p["id"],
+                "name": p["name"],
+                "price": p["price"],
+                "stock": p["stock"]
             }
-            for p in results
+            for p in response.json()
         ]
         return json.dumps(products)
     except Exception as e:
         logger.error(f"search_products failed: {e}")
         return f"Error: {str(e)}"
-    finally:
-        db.close()
+
+
+@tool
+def search_products_batch(queries: list[str]) -> str:
+    """Search for several products at once (a shopping list like "eggs, milk, bread"). Returns JSON {query: [products]}"""
+    if not any(q.strip() for q in queries):
+        return json.dumps({})
+
+    try:
+        # One Backend request for the whole list; it shares cache entries with search_products
+        response = backend.post("/search/products:batch", json={"queries": queries, "limit": 10})
+        response.raise_for_status()
+
+        results = {
+            r["query"]: [
+                {
+                    "id": p["id"],
+                    "name": p["name"],
+                    "price": p["price"],
+                    "stock": p["stock"]
+                }
+                for p in r["products"]
+            ]
+            for r in response.json()
+        }
+        return json.dumps(results)
+    except Exception as e:
+        logger.error(f"search_products_batch failed: {e}")
+        return f"Error: {str(e)}"
 
 
 @tool